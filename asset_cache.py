@@ -0,0 +1,288 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from PIL import Image
+from export_json_layout import SUPPORTED_VIDEO_FORMATS, GifLoader, StaticImageLoader, get_loader
+
+# Default cap on the total size of decoded frames kept on disk.
+ASSET_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+def default_cache_dir():
+    return os.environ.get('GIF_EDITOR_CACHE_DIR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'python_gif_editor', 'assets')
+
+class MappedLoader:
+    """Loader over decoded RGBA frames memory-mapped from the asset cache, read-only and uncopied."""
+    def __init__(self, path, frames, key_prefix, fps=0, durations=None):
+        self.path = path
+        self.frames = frames
+        self.length = len(frames)
+        self.key_prefix = tuple(key_prefix)
+        self.fps = fps
+        self._durations = durations
+    def get_frame(self, idx, total=None, copy=True):
+        h, w = self.frames.shape[1:3]
+        img = Image.frombuffer('RGBA', (w, h), self.frames[(idx or 0) % self.length], 'raw', 'RGBA', 0, 1)
+        return img.copy() if copy else img
+    def frame_key(self, idx):
+        return self.key_prefix + ((idx or 0) % self.length,)
+    def num_frames(self):
+        return self.length
+    def durations(self):
+        return self._durations[:self.length] if self._durations else None
+    def close(self):
+        self.frames = None
+
+class _Recorder:
+    """Wraps a decoding loader and writes each frame into the cache the first time it is decoded.
+
+    The entry is committed only once every frame has been seen, in any order.
+    """
+    def __init__(self, loader, cache, key, meta):
+        self.loader = loader
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        self._seen = set()
+        self._fp = None
+        self._tmp = None
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+    def get_frame(self, idx, total=None, copy=True):
+        img = self.loader.get_frame(idx, total, copy)
+        if self.key is not None:
+            self._record(self.loader.frame_key(idx)[-1], img)
+        return img
+    def _record(self, frame_idx, img):
+        if frame_idx in self._seen:
+            return
+        if img.size != (self.meta['width'], self.meta['height']):
+            self._abort()
+            return
+        frame_bytes = img.width * img.height * 4
+        if self._fp is None:
+            self._tmp = self.cache._path(self.key, f'.raw.{os.getpid()}.tmp')
+            self._fp = open(self._tmp, 'wb')
+            self._fp.truncate(self.loader.num_frames() * frame_bytes)
+        self._fp.seek(frame_idx * frame_bytes)
+        self._fp.write(img.convert('RGBA').tobytes())
+        self._seen.add(frame_idx)
+        frames = self.loader.num_frames()
+        if len(self._seen) >= frames and all(i in self._seen for i in range(frames)):
+            # Sized for the loader's first frame count; trim to the frames it really has.
+            self._fp.truncate(frames * frame_bytes)
+            self._fp.close()
+            self._fp = None
+            self.meta['frames'] = frames
+            self.cache._commit(self.key, self._tmp, self.meta)
+            self.key = None
+    def frame_key(self, idx):
+        return self.loader.frame_key(idx)
+    def num_frames(self):
+        return self.loader.num_frames()
+    def _abort(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+            os.remove(self._tmp)
+        self.key = None
+    def close(self):
+        self._abort()
+        self.loader.close()
+
+class _SharedLoader:
+    """Per-layer handle on a loader shared by several layers of one process."""
+    def __init__(self, cache, key):
+        self._cache = cache
+        self._key = key
+        self.loader = cache._open[key][0]
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+    def get_frame(self, idx, total=None, copy=True):
+        return self.loader.get_frame(idx, total, copy)
+    def frame_key(self, idx):
+        return self.loader.frame_key(idx)
+    def num_frames(self):
+        return self.loader.num_frames()
+    def close(self):
+        if self._key is not None:
+            self._cache._release(self._key)
+            self._key = None
+
+class AssetCache:
+    """Content-addressed LRU cache of decoded media frames, shared in-process and mapped from disk.
+
+    Entries are keyed by path, mtime, size and decode parameters; ``root=None`` keeps only the in-process sharing.
+    """
+    def __init__(self, root=None, max_bytes=ASSET_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._open = {}
+    def __getstate__(self):
+        # Shipped to pool workers without the open loaders.
+        return {'root': self.root, 'max_bytes': self.max_bytes, 'hits': 0, 'misses': 0, '_open': {}}
+    def _path(self, key, suffix):
+        return os.path.join(self.root, key + suffix)
+    @staticmethod
+    def asset_key(path, params):
+        st = os.stat(path)
+        blob = json.dumps([os.path.abspath(path), st.st_mtime_ns, st.st_size, params], sort_keys=True)
+        return hashlib.sha1(blob.encode()).hexdigest()
+    @staticmethod
+    def _describe(item):
+        path = item['path']
+        ext = os.path.splitext(path)[1].lower()
+        # Mirrors get_loader's dispatch; key_prefix matches the loader's frame_key().
+        if item['type'] == 'gif' or ext == '.gif':
+            return {'kind': 'gif'}, (path,)
+        if item['type'] == 'video' or ext in SUPPORTED_VIDEO_FORMATS:
+            size = [item['width'], item['height']]
+            return {'kind': 'video', 'size': size}, (path, tuple(size))
+        return {'kind': 'image'}, (path,)
+    def open(self, item, lazy_gif=None):
+        """Return a loader for ``item``, shared with other layers using the same asset."""
+        params, key_prefix = self._describe(item)
+        key = self.asset_key(item['path'], params)
+        entry = self._open.get(key)
+        if entry is None:
+            entry = self._open[key] = [self._load(item, lazy_gif, key, params, key_prefix), 0]
+        entry[1] += 1
+        return _SharedLoader(self, key)
+    def _release(self, key):
+        entry = self._open[key]
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._open[key]
+            entry[0].close()
+    def _load(self, item, lazy_gif, key, params, key_prefix):
+        if self.root is not None:
+            mapped = self._map(key, item['path'], key_prefix)
+            if mapped is not None:
+                self.hits += 1
+                return mapped
+            self.misses += 1
+        loader = get_loader(item, lazy_gif=lazy_gif)
+        if self.root is None:
+            return loader
+        meta = {'path': os.path.abspath(item['path']), 'params': params, 'key_prefix': list(key_prefix),
+                'fps': getattr(loader, 'fps', 0), 'durations': loader.durations()}
+        frames = loader.num_frames()
+        if params['kind'] == 'video':
+            w, h = item['width'], item['height']
+        else:
+            with Image.open(item['path']) as im:
+                w, h = im.size
+        if frames * w * h * 4 > self.max_bytes:
+            return loader
+        meta['width'], meta['height'] = w, h
+        os.makedirs(self.root, exist_ok=True)
+        if isinstance(loader, StaticImageLoader) or (isinstance(loader, GifLoader) and not loader.lazy):
+            # Already fully decoded; record every frame now.
+            recorder = _Recorder(loader, self, key, meta)
+            for idx in range(frames):
+                recorder.get_frame(idx, frames, copy=False)
+            return loader
+        return _Recorder(loader, self, key, meta)
+    def _map(self, key, path, key_prefix):
+        meta_path = self._path(key, '.json')
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            shape = (meta['frames'], meta['height'], meta['width'], 4)
+            durations = meta['durations']
+            frames = np.memmap(self._path(key, '.raw'), np.uint8, 'r', shape=shape)
+        except (OSError, ValueError, KeyError):
+            return None
+        # The JSON file's mtime records last use for eviction.
+        os.utime(meta_path)
+        return MappedLoader(path, frames, key_prefix, meta.get('fps', 0), durations)
+    def _commit(self, key, tmp_path, meta):
+        meta['bytes'] = os.path.getsize(tmp_path)
+        meta['created'] = time.time()
+        os.replace(tmp_path, self._path(key, '.raw'))
+        tmp_meta = self._path(key, f'.json.{os.getpid()}.tmp')
+        with open(tmp_meta, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, self._path(key, '.json'))
+        self.prune()
+    def entries(self):
+        """Return (key, meta, last_used) for every committed entry, least recently used first."""
+        if self.root is None or not os.path.isdir(self.root):
+            return []
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.root, name)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                last_used = os.path.getmtime(meta_path)
+            except (OSError, ValueError):
+                continue
+            entries.append((name[:-len('.json')], meta, last_used))
+        entries.sort(key=lambda e: e[2])
+        return entries
+    def remove(self, key):
+        for suffix in ('.json', '.raw'):
+            try:
+                os.remove(self._path(key, suffix))
+            except FileNotFoundError:
+                pass
+    def prune(self, max_bytes=None):
+        """Evict least recently used entries until the total fits ``max_bytes``."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(meta.get('bytes', 0) for _, meta, _ in entries)
+        removed = 0
+        for key, meta, _ in entries:
+            if total <= max_bytes:
+                break
+            self.remove(key)
+            total -= meta.get('bytes', 0)
+            removed += 1
+        return removed
+    def clear(self):
+        if self.root is None or not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if name.endswith(('.json', '.raw', '.tmp')):
+                os.remove(os.path.join(self.root, name))
+    def stats(self):
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'bytes': sum(meta.get('bytes', 0) for _, meta, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect or clear the decoded-asset cache.")
+    parser.add_argument('command', choices=['list', 'stats', 'prune', 'clear'])
+    parser.add_argument('--dir', default=default_cache_dir(), help="Cache directory (default %(default)s)")
+    parser.add_argument('--max-mb', type=int, default=ASSET_CACHE_MAX_BYTES // (1024 * 1024),
+                        help="Size cap used by prune")
+    args = parser.parse_args()
+
+    cache = AssetCache(args.dir, args.max_mb * 1024 * 1024)
+    if args.command == 'list':
+        for key, meta, last_used in cache.entries():
+            print(f"{key[:12]}  {meta.get('bytes', 0) / (1024 * 1024):8.1f} MB  {meta['frames']:5d} x "
+                  f"{meta['width']}x{meta['height']}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))}  "
+                  f"{meta['path']}")
+    elif args.command == 'stats':
+        stats = cache.stats()
+        print(f"{stats['entries']} entries, {stats['bytes'] / (1024 * 1024):.1f} MB of "
+              f"{stats['max_bytes'] / (1024 * 1024):.0f} MB in {args.dir}")
+    elif args.command == 'prune':
+        print(f"Removed {cache.prune()} entries")
+    else:
+        cache.clear()
+        print(f"Cleared {args.dir}")
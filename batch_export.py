@@ -0,0 +1,265 @@
+import json
+import os
+import time
+import traceback
+from collections import OrderedDict
+from export_json_layout import (COMPOSITE_BACKENDS, QUALITY_TIERS, LayoutRenderer, _frame_ranges, _settled_period,
+                                export_sequence, parse_layout, probe_layout)
+from frame_writers import ANIMATED_FORMATS, LINK_MODES, PngSequenceWriter
+
+# Per-job settings a manifest entry may set, with their defaults.
+JOB_DEFAULTS = {
+    'frames': None,
+    'output': None,
+    'sequence_dir': None,
+    'fps': 24,
+    'compress_level': 6,
+    'raw': False,
+    'backend': 'pil',
+    'cache_mb': 256,
+    'flatten': True,
+    'dedupe': True,
+    'link': 'hardlink',
+    'quality': 'final',
+    'timed': False,
+}
+# Layout renderers each worker keeps open between work units.
+WORKER_RENDERERS = 4
+
+def load_jobs(layout_paths=(), manifest=None, defaults=None):
+    """Build job dicts from layout paths and/or a JSON or one-path-per-line manifest."""
+    base = dict(JOB_DEFAULTS, **(defaults or {}))
+    entries = [{'layout': path} for path in layout_paths]
+    if manifest:
+        root = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest) as f:
+            text = f.read()
+        try:
+            listed = json.loads(text)
+        except ValueError:
+            listed = [line.strip() for line in text.splitlines() if line.strip() and not line.startswith('#')]
+        for entry in listed:
+            entry = {'layout': entry} if isinstance(entry, str) else dict(entry)
+            for key in ('layout', 'output', 'sequence_dir'):
+                if entry.get(key):
+                    entry[key] = os.path.join(root, entry[key])
+            entries.append(entry)
+    jobs = []
+    for idx, entry in enumerate(entries):
+        unknown = set(entry) - set(JOB_DEFAULTS) - {'layout'}
+        if unknown:
+            raise ValueError(f"Unknown job settings {sorted(unknown)} for {entry.get('layout')}")
+        jobs.append(dict(base, **entry, id=idx))
+    return jobs
+
+# Per-process state for batch workers, set up by _init_batch_worker.
+_assets = None
+_renderers = OrderedDict()
+
+def _init_batch_worker(asset_root, asset_max_bytes):
+    # With no root the cache still shares loaders between the layouts this worker renders.
+    global _assets
+    from asset_cache import AssetCache
+    _assets = AssetCache(asset_root, asset_max_bytes)
+
+def _render_options(job):
+    return dict(cache_bytes=job['cache_mb'] * 1024 * 1024, backend=job['backend'], flatten=job['flatten'],
+                quality=job['quality'], fps=job['fps'] if job['timed'] else None)
+
+def _batch_renderer(job):
+    options = _render_options(job)
+    key = (job['layout'], job['frames']) + tuple(sorted(options.items()))
+    renderer = _renderers.get(key)
+    if renderer is None:
+        renderer = _renderers[key] = LayoutRenderer(parse_layout(job['layout']), job['frames'], assets=_assets,
+                                                    **options)
+        while len(_renderers) > WORKER_RENDERERS:
+            _renderers.popitem(last=False)[1].close()
+    else:
+        _renderers.move_to_end(key)
+    return renderer
+
+def _sequence_dir(job):
+    if job['sequence_dir']:
+        return job['sequence_dir']
+    return os.path.splitext(job['layout'])[0]
+
+def _run_range(job, total_frames, start, stop):
+    """Render frames [start, stop) of a PNG/raw sequence job; returns (start time, busy seconds, period)."""
+    began, start_time = time.perf_counter(), time.time()
+    renderer = _batch_renderer(job)
+    writer = PngSequenceWriter(_sequence_dir(job), total_frames, job['compress_level'], job['raw'])
+    for idx in range(start, stop):
+        writer.write(idx, renderer.render(idx))
+    return start_time, time.perf_counter() - began, renderer.period()
+
+def _run_export(job):
+    """Export an animated-output job in one piece; returns (start time, busy seconds, None)."""
+    began, start_time = time.perf_counter(), time.time()
+    export_sequence(job['layout'], job['frames'], cache_bytes=job['cache_mb'] * 1024 * 1024, backend=job['backend'],
+                    output=job['output'], fps=job['fps'], compress_level=job['compress_level'], raw=job['raw'],
+                    flatten=job['flatten'], dedupe=job['dedupe'], link=job['link'], assets=_assets,
+                    quality=job['quality'], timed=job['timed'])
+    return start_time, time.perf_counter() - began, None
+
+def _plan(job, workers, targets):
+    """Probe a job and return (summary, work units); units are (fn, args) pairs.
+
+    Raises ValueError if the job writes to an output or folder already in ``targets``.
+    """
+    target = os.path.abspath(job['output'] or _sequence_dir(job))
+    if target in targets:
+        raise ValueError(f"{target} is also the output of {targets[target]}; set output or sequence_dir")
+    targets[target] = job['layout']
+    layout = parse_layout(job['layout'])
+    total_frames, canvas_size, layout_period = probe_layout(layout, job['frames'], _render_options(job)['fps'])
+    period = min(layout_period, total_frames) if job['dedupe'] else total_frames
+    summary = {'layout': job['layout'], 'status': 'pending', 'frames': total_frames, 'period': period,
+               'size': canvas_size, 'output': job['output'] or _sequence_dir(job)}
+    if job['output']:
+        ext = os.path.splitext(job['output'])[1].lower()
+        if ext not in ANIMATED_FORMATS:
+            raise ValueError(f"Unsupported output format {ext!r}")
+        return summary, [(_run_export, (job,))]
+    # Header files (the raw sidecar) are written once here, not by every unit.
+    PngSequenceWriter(_sequence_dir(job), total_frames, job['compress_level'], job['raw'], canvas_size)
+    return summary, [(_run_range, (job, total_frames, start, stop)) for start, stop in _frame_ranges(period, workers)]
+
+def _finish_sequence(job, summary, periods):
+    total_frames, period = summary['frames'], summary['period']
+    writer = PngSequenceWriter(_sequence_dir(job), total_frames, job['compress_level'], job['raw'], link=job['link'])
+    # Units report their renderer's period; workers that disagree give no single one.
+    reported = next(iter(periods)) if len(periods) == 1 else None
+    settled = _settled_period(period, total_frames, period, reported)
+    if settled != period:
+        renderer = LayoutRenderer(parse_layout(job['layout']), job['frames'], assets=_assets, **_render_options(job))
+        try:
+            for idx in range(period, settled):
+                writer.write(idx, renderer.render(idx))
+        finally:
+            renderer.close()
+    summary['period'] = settled
+    for idx in range(settled, total_frames):
+        writer.repeat(idx, idx % settled)
+
+def run_batch(jobs, workers=None, asset_root=None, asset_max_bytes=2 * 1024 * 1024 * 1024, progress=None):
+    """Export every job on one process pool and return a summary per job.
+
+    A failing job is recorded with its error and the rest carry on.
+    """
+    import multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    workers = workers or os.cpu_count() or 1
+    summaries = []
+    units = []
+    remaining = {}
+    periods = {}
+    targets = {}
+    def finish(job_id, status, error=None):
+        summary = summaries[job_id]
+        summary['status'] = status
+        if error is not None:
+            summary['error'] = error
+        summary['finished'] = time.time()
+        summary['wall_seconds'] = summary['finished'] - (summary.get('started') or summary['finished'])
+        remaining.pop(job_id, None)
+        if progress is not None:
+            progress(summary)
+    for job in jobs:
+        summaries.append({'layout': job['layout'], 'status': 'pending', 'output': job['output'],
+                          'busy_seconds': 0.0})
+        try:
+            summary, job_units = _plan(job, workers, targets)
+        except Exception as e:
+            finish(job['id'], 'failed', f'{type(e).__name__}: {e}')
+            continue
+        summaries[job['id']].update(summary)
+        remaining[job['id']] = len(job_units)
+        # Whole-file exports are the longest units; queue them first so they do not trail at the end.
+        units.extend((0 if fn is _run_export else 1, job['id'], fn, args) for fn, args in job_units)
+    units.sort(key=lambda unit: unit[0])
+    batch_start = time.perf_counter()
+    jobs_by_id = {job['id']: job for job in jobs}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_batch_worker, initargs=(asset_root, asset_max_bytes)) as pool:
+        pending = {}
+        for _, job_id, fn, args in units:
+            pending[pool.submit(fn, *args)] = job_id
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = pending.pop(future)
+                if job_id not in remaining:
+                    continue
+                try:
+                    start_time, busy, period = future.result()
+                except Exception:
+                    for other, other_id in pending.items():
+                        if other_id == job_id:
+                            other.cancel()
+                    finish(job_id, 'failed', traceback.format_exc(limit=3).strip().splitlines()[-1])
+                    continue
+                summary = summaries[job_id]
+                summary['started'] = min(summary.get('started') or start_time, start_time)
+                summary['busy_seconds'] += busy
+                if period is not None:
+                    periods.setdefault(job_id, set()).add(period)
+                remaining[job_id] -= 1
+                if remaining[job_id] == 0:
+                    try:
+                        if not jobs_by_id[job_id]['output']:
+                            _finish_sequence(jobs_by_id[job_id], summaries[job_id], periods.get(job_id, ()))
+                    except Exception as e:
+                        finish(job_id, 'failed', f'{type(e).__name__}: {e}')
+                    else:
+                        finish(job_id, 'ok')
+    for summary in summaries:
+        summary['batch_seconds'] = time.perf_counter() - batch_start
+    return summaries
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Export many layout JSON files on one worker pool.")
+    parser.add_argument('layouts', nargs='*', help="Layout JSON files to export")
+    parser.add_argument('--manifest',
+                        help="JSON list of layout paths or {'layout': ..., <setting>: ...} objects (e.g. output, "
+                        "sequence_dir), or a text file with one layout path per line; paths are relative to it")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--summary', default='batch_summary.json', help="Where to write the per-job summary JSON")
+    parser.add_argument('--frames', type=int, default=None, help="Default frame count (default=max over all media)")
+    parser.add_argument('--fps', type=float, default=24,
+                        help="Default output frame rate of animated files, and of layer timing with --timed")
+    parser.add_argument('--timed', action='store_true',
+                        help="Play layers at their own GIF frame durations or video fps by default")
+    parser.add_argument('--compress-level', type=int, default=6, choices=range(10), metavar='0-9',
+                        help="Default PNG/APNG zlib compression level")
+    parser.add_argument('--backend', choices=COMPOSITE_BACKENDS, default='pil', help="Default compositing backend")
+    parser.add_argument('--quality', choices=QUALITY_TIERS, default='final', help="Default layer resampling tier")
+    parser.add_argument('--link', choices=LINK_MODES, default='hardlink',
+                        help="How repeated frames of a PNG sequence are written")
+    parser.add_argument('--asset-cache', metavar='DIR', default=None,
+                        help="Directory of decoded media reused across layouts and runs (default: per-user cache dir)")
+    parser.add_argument('--asset-cache-mb', type=int, default=2048, help="Size cap of the decoded-asset cache in MB")
+    parser.add_argument('--no-asset-cache', action='store_true', help="Share decoded media only within each worker")
+    args = parser.parse_args()
+    if not args.layouts and not args.manifest:
+        parser.error("give layout files and/or --manifest")
+
+    asset_root = None
+    if not args.no_asset_cache:
+        from asset_cache import default_cache_dir
+        asset_root = args.asset_cache or default_cache_dir()
+    jobs = load_jobs(args.layouts, args.manifest, {'frames': args.frames, 'fps': args.fps,
+                                                    'compress_level': args.compress_level,
+                                                    'backend': args.backend, 'link': args.link,
+                                                    'quality': args.quality, 'timed': args.timed})
+    def report(summary):
+        detail = summary.get('error') or f"{summary.get('frames')} frames to {summary['output']}"
+        print(f"[{summary['status']}] {summary['layout']}: {detail} ({summary['wall_seconds']:.1f}s)", flush=True)
+    summaries = run_batch(jobs, args.workers, asset_root, args.asset_cache_mb * 1024 * 1024, progress=report)
+    with open(args.summary, 'w') as f:
+        json.dump(summaries, f, indent=2)
+    failed = sum(summary['status'] != 'ok' for summary in summaries)
+    print(f"{len(summaries) - failed}/{len(summaries)} layouts exported; summary written to {args.summary}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,238 @@
+"""Benchmark export throughput, peak memory and stage costs on synthetic layouts.
+
+Each scenario (layer count, canvas size, rotation, media mix, output format)
+runs export_sequence in a fresh child process, so peak RSS is per scenario,
+and reports frames/s, wall time, peak RSS and per-stage seconds from
+ExportProfiler. An offscreen-Qt micro-benchmark times
+DraggableWidget._update_gif_frame (cold, and warm from the pixmap cache)
+and _update_image_frame when PyQt5 is installed. Results are written as
+JSON; --compare flags regressions against a stored baseline and exits with
+status 1 if any are found.
+
+    python benchmarks/bench_suite.py --json results.json
+    python benchmarks/bench_suite.py --compare baseline.json --threshold 0.1
+    python benchmarks/bench_suite.py --results new.json --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic import MediaPool, build_layout, make_gif, make_png  # noqa: E402
+
+# name, canvas, layers, angle, mix, frames, output extension (None = PNG sequence), backend
+SCENARIOS = [
+    ('stills-4-hd', (1280, 720), 4, 0.0, 'stills', 48, None, 'pil'),
+    ('gifs-8-sd', (640, 360), 8, 0.0, 'gifs', 48, None, 'pil'),
+    ('gifs-8-sd-rotated', (640, 360), 8, 15.0, 'gifs', 48, None, 'pil'),
+    ('mixed-8-hd', (1280, 720), 8, 10.0, 'mixed', 48, None, 'pil'),
+    ('mixed-8-hd-numpy', (1280, 720), 8, 10.0, 'mixed', 48, None, 'numpy'),
+    ('videos-4-hd-mp4', (1280, 720), 4, 0.0, 'videos', 48, '.mp4', 'pil'),
+    ('mixed-32-sd-gif', (640, 360), 32, 30.0, 'mixed', 48, '.gif', 'pil'),
+    ('gifs-64-fhd', (1920, 1080), 64, 5.0, 'gifs', 24, None, 'pil'),
+]
+QUICK = {'gifs-8-sd', 'mixed-8-hd', 'mixed-32-sd-gif'}
+# Metrics compared against a baseline and whether larger values are better.
+METRICS = {'fps': True, 'peak_rss_mb': False, 'ms_per_call': False}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_scenario(spec):
+    """Run one scenario in this process and return its result dict."""
+    from export_json_layout import export_sequence
+    from export_profiler import ExportProfiler
+    with tempfile.TemporaryDirectory() as folder:
+        layout_path = build_layout(folder, tuple(spec['canvas']), spec['layers'], spec['angle'], spec['mix'],
+                                   media=MediaPool(spec['media']))
+        output = os.path.join(folder, 'out', 'result' + spec['output']) if spec['output'] else None
+        profiler = ExportProfiler()
+        start = time.perf_counter()
+        summary = export_sequence(layout_path, spec['frames'], output=output, backend=spec['backend'],
+                                  workers=spec['workers'], dedupe=False, profiler=profiler)
+        wall = time.perf_counter() - start
+    profile = summary['profile']
+    return {
+        'frames': summary['frames'],
+        'wall_seconds': wall,
+        'fps': summary['frames'] / wall if wall else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {name: b['seconds'] for name, b in profile['stages'].items()},
+        'slowest_layers': [{'path': os.path.basename(str(layer['path'])), 'type': layer['type'],
+                            'seconds': layer['seconds']} for layer in profile['layers'][:3]],
+        'cache': summary['cache'],
+    }
+
+
+def run_in_child(spec):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--scenario', json.dumps(spec)],
+                          capture_output=True, text=True)
+    if proc.returncode:
+        return {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f'exit {proc.returncode}'}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def bench_widget(folder, calls=200, sizes=((320, 240), (1280, 720)), angles=(0.0, 20.0)):
+    """Time the widget's per-frame transform under an offscreen Qt platform."""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5.QtWidgets import QApplication, QLabel
+        from PyQt5.QtGui import QMovie, QPixmap
+        from draggable_video_player import PIXMAP_CACHE, DraggableWidget
+    except ImportError as e:
+        return {'skipped': f'Qt is unavailable: {e}'}
+    app = QApplication.instance() or QApplication([])
+    gif_path = make_gif(os.path.join(folder, 'widget.gif'), 320, 240, frames=12)
+    png_path = make_png(os.path.join(folder, 'widget.png'), 320, 240)
+    results = {}
+    for width, height in sizes:
+        for angle in angles:
+            label = QLabel()
+            movie = QMovie(gif_path)
+            label.setMovie(movie)
+            movie.jumpToFrame(0)
+            widget = DraggableWidget(label, is_gif=True)
+            # Drive frames by hand so only the transform path is timed.
+            movie.frameChanged.disconnect(widget._update_gif_frame)
+            widget._current_width, widget._current_height, widget._rotation = width, height, angle
+            count = max(1, movie.frameCount())
+            # Cold: every call recomposes, as on the first loop or after a resize.
+            elapsed = 0.0
+            for i in range(calls):
+                PIXMAP_CACHE.invalidate(widget._cache_owner)
+                movie.jumpToFrame(i % count)
+                start = time.perf_counter()
+                widget._update_gif_frame()
+                elapsed += time.perf_counter() - start
+            results[f'gif-{width}x{height}-rot{angle:g}'] = {'ms_per_call': elapsed * 1000 / calls}
+            # Warm: later loops, served from the pixmap cache once every frame is composed.
+            for i in range(count):
+                movie.jumpToFrame(i)
+                widget._update_gif_frame()
+            elapsed = 0.0
+            for i in range(calls):
+                movie.jumpToFrame(i % count)
+                start = time.perf_counter()
+                widget._update_gif_frame()
+                elapsed += time.perf_counter() - start
+            results[f'gif-{width}x{height}-rot{angle:g}-warm'] = {'ms_per_call': elapsed * 1000 / calls}
+            image_label = QLabel()
+            image = DraggableWidget(image_label, is_image=True, image_pixmap=QPixmap(png_path))
+            image._current_width, image._current_height, image._rotation = width, height, angle
+            start = time.perf_counter()
+            for _ in range(calls):
+                image._update_image_frame()
+            results[f'image-{width}x{height}-rot{angle:g}'] = {
+                'ms_per_call': (time.perf_counter() - start) * 1000 / calls}
+            widget.close()
+            image.close()
+            app.processEvents()
+    return results
+
+
+def compare(baseline, current, threshold):
+    """Print metric changes and return the names of regressed entries."""
+    regressions = []
+    sections = [('scenario', baseline.get('scenarios', {}), current.get('scenarios', {})),
+                ('widget', baseline.get('widget', {}), current.get('widget', {}))]
+    print(f"{'entry':<34} {'metric':<12} {'baseline':>10} {'current':>10} {'change':>8}")
+    for section, old_entries, new_entries in sections:
+        for name in sorted(set(old_entries) & set(new_entries)):
+            old, new = old_entries[name], new_entries[name]
+            if not isinstance(old, dict) or not isinstance(new, dict):
+                continue
+            for metric, higher_is_better in METRICS.items():
+                if old.get(metric) is None or new.get(metric) is None or not old[metric]:
+                    continue
+                change = (new[metric] - old[metric]) / old[metric]
+                worse = -change if higher_is_better else change
+                flag = '  REGRESSION' if worse > threshold else ''
+                print(f"{name:<34} {metric:<12} {old[metric]:>10.2f} {new[metric]:>10.2f} {change:>+8.0%}{flag}")
+                if flag:
+                    regressions.append(f'{section}:{name}:{metric}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="Run a small subset of scenarios")
+    parser.add_argument('--only', default=None, help="Comma-separated scenario names to run")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per scenario; the fastest is kept")
+    parser.add_argument('--workers', type=int, default=1, help="Render worker processes passed to export_sequence")
+    parser.add_argument('--no-widget', action='store_true', help="Skip the offscreen Qt widget benchmark")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    parser.add_argument('--results', help="Load results from this JSON file instead of running")
+    parser.add_argument('--compare', metavar='BASELINE', help="Compare against a baseline results JSON")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="Relative change counted as a regression (default 0.15)")
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(json.loads(args.scenario))))
+        return
+
+    if args.results:
+        with open(args.results) as f:
+            results = json.load(f)
+    else:
+        names = set(args.only.split(',')) if args.only else QUICK if args.quick else None
+        results = {'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'cpus': os.cpu_count(), 'workers': args.workers, 'time': time.time()},
+                   'scenarios': {}, 'widget': {}}
+        with tempfile.TemporaryDirectory() as media:
+            print(f"{'scenario':<22} {'frames':>6} {'fps':>8} {'wall s':>7} {'rss MB':>7}  top stages")
+            for name, canvas, layers, angle, mix, frames, output, backend in SCENARIOS:
+                if names is not None and name not in names:
+                    continue
+                spec = {'canvas': canvas, 'layers': layers, 'angle': angle, 'mix': mix, 'frames': frames,
+                        'output': output, 'backend': backend, 'workers': args.workers, 'media': media}
+                runs = [run_in_child(spec) for _ in range(max(1, args.repeat))]
+                ok = [run for run in runs if 'error' not in run]
+                result = min(ok, key=lambda run: run['wall_seconds']) if ok else runs[0]
+                result['params'] = {k: v for k, v in spec.items() if k != 'media'}
+                results['scenarios'][name] = result
+                if 'error' in result:
+                    print(f"{name:<22} failed: {result['error']}")
+                    continue
+                stages = sorted(result['stages'].items(), key=lambda kv: kv[1], reverse=True)[:3]
+                rss = result['peak_rss_mb']
+                print(f"{name:<22} {result['frames']:>6} {result['fps']:>8.1f} {result['wall_seconds']:>7.2f} "
+                      f"{rss if rss is not None else float('nan'):>7.0f}  "
+                      + ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in stages))
+            if not args.no_widget:
+                results['widget'] = bench_widget(media)
+                if 'skipped' in results['widget']:
+                    print(f"widget benchmark skipped: {results['widget']['skipped']}")
+                for name, entry in results['widget'].items():
+                    if isinstance(entry, dict):
+                        print(f"{name:<22} {entry['ms_per_call']:>8.3f} ms/call")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: " + ', '.join(regressions))
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Generate synthetic media and layout JSON files for the benchmarks.
+
+Everything is drawn with PIL or rendered by ffmpeg's testsrc pattern, so the
+benchmarks need no external assets. Output is deterministic for a given seed.
+"""
+import json
+import os
+import random
+import subprocess
+
+import imageio_ffmpeg
+from PIL import Image, ImageDraw
+
+MEDIA_MIXES = ('stills', 'gifs', 'videos', 'mixed')
+
+
+def make_png(path, width, height, seed=0):
+    rng = random.Random(seed)
+    img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 2 + 1), y0 + rng.randrange(height // 2 + 1)
+        draw.rectangle((x0, y0, x1, y1), fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256), 220))
+    img.save(path)
+    return path
+
+
+def make_gif(path, width, height, frames=12, duration=80, seed=0):
+    rng = random.Random(seed)
+    color = (rng.randrange(256), rng.randrange(256), rng.randrange(256), 255)
+    images = []
+    for i in range(frames):
+        frame = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        x = (i * width) // frames
+        ImageDraw.Draw(frame).ellipse((x, height // 4, x + width // 3, height // 4 + height // 2), fill=color)
+        images.append(frame)
+    images[0].save(path, save_all=True, append_images=images[1:], duration=duration, loop=0, disposal=2)
+    return path
+
+
+def make_video(path, width, height, seconds=2, fps=24):
+    subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error',
+                    '-f', 'lavfi', '-i', f'testsrc=size={width}x{height}:rate={fps}', '-t', str(seconds),
+                    '-pix_fmt', 'yuv420p', '-c:v', 'libx264', path], check=True)
+    return path
+
+
+class MediaPool:
+    """Creates each (kind, size) asset once per folder and hands out its path.
+
+    Files already present in ``folder`` are reused, so several processes can
+    share one media folder.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self._paths = {}
+
+    def get(self, kind, width, height, seed=0):
+        key = (kind, width, height, seed)
+        if key not in self._paths:
+            ext = {'image': '.png', 'gif': '.gif', 'video': '.mp4'}[kind]
+            path = os.path.join(self.folder, f'{kind}_{width}x{height}_{seed}{ext}')
+            if not os.path.exists(path):
+                if kind == 'video':
+                    make_video(path, width, height)
+                else:
+                    {'image': make_png, 'gif': make_gif}[kind](path, width, height, seed=seed)
+            self._paths[key] = path
+        return self._paths[key]
+
+
+def _layer_kind(mix, i):
+    if mix == 'stills':
+        return 'image'
+    if mix == 'gifs':
+        return 'gif' if i else 'image'
+    if mix == 'videos':
+        return 'video' if i else 'image'
+    return ('image', 'gif', 'video')[i % 3]
+
+
+def build_layout(folder, canvas=(640, 360), layers=4, angle=0.0, mix='mixed', seed=0, media=None):
+    """Write a layout.json under ``folder``/out and return its path.
+
+    The first layer is a full-canvas background; the others are placed at
+    random, a third of the canvas in size, rotated alternately by +/- ``angle``.
+    """
+    if mix not in MEDIA_MIXES:
+        raise ValueError(f"Unknown media mix {mix!r}")
+    rng = random.Random(seed)
+    media = media or MediaPool(folder)
+    width, height = canvas
+    items = []
+    for i in range(layers):
+        kind = _layer_kind(mix, i)
+        if i == 0:
+            w, h, x, y, rotation = width, height, 0, 0, 0.0
+        else:
+            w, h = max(16, width // 3), max(16, height // 3)
+            x, y = rng.randrange(width - w + 1), rng.randrange(height - h + 1)
+            rotation = angle if i % 2 else -angle
+        # Sources are half the layer size (rounded to even for yuv420p) so every frame is resized.
+        src_w, src_h = max(2, w // 4 * 2), max(2, h // 4 * 2)
+        items.append({'path': media.get(kind, src_w, src_h, seed=i % 4), 'type': kind, 'x': x, 'y': y,
+                      'width': w, 'height': h, 'rotation_degrees': rotation, 'order': i})
+    layout_path = os.path.join(folder, 'out', 'layout.json')
+    os.makedirs(os.path.dirname(layout_path), exist_ok=True)
+    with open(layout_path, 'w') as f:
+        json.dump(items, f)
+    return layout_path
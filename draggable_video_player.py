@@ -3,15 +3,68 @@ import os
 import json
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QPushButton, QVBoxLayout, QFileDialog,
-    QLabel, QFormLayout, QSpinBox, QDoubleSpinBox, QHBoxLayout, QDialog
+    QLabel, QFormLayout, QSpinBox, QDoubleSpinBox, QHBoxLayout, QDialog, QComboBox, QProgressBar
 )
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
 from PyQt5.QtMultimediaWidgets import QVideoWidget
-from PyQt5.QtCore import Qt, QUrl, QPoint, QSize, pyqtSignal
-from PyQt5.QtGui import QMovie, QTransform, QPixmap, QPainter, QPen, QColor
+from PyQt5.QtCore import Qt, QUrl, QPoint, QSize, QRect, QTimer, QThread, pyqtSignal
+from PyQt5.QtGui import QMovie, QTransform, QPixmap, QPainter, QPen, QColor, QImage, QRegion
 import math
+import time
+import itertools
+import threading
+from collections import OrderedDict
 
-from export_json_layout import export_sequence, compute_content_bounding_box
+from export_json_layout import (export_sequence, compute_content_bounding_box, get_loader, transform_layer,
+                                VideoLoader, QUALITY_TIERS, ExportCancelled)
+
+# Memory budget shared by the composed frames of all widgets.
+PIXMAP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+class PixmapCache:
+    """LRU of composed widget frames under one byte budget, keyed by (owner, frame, width, height, rotation)."""
+    def __init__(self, max_bytes=PIXMAP_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._owner_keys = {}
+    @staticmethod
+    def _cost(pixmap):
+        return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+    def get(self, key):
+        pixmap = self._entries.get(key)
+        if pixmap is not None:
+            self._entries.move_to_end(key)
+        return pixmap
+    def put(self, key, pixmap):
+        cost = self._cost(pixmap)
+        if cost > self.max_bytes:
+            return
+        self._discard(key)
+        self._entries[key] = pixmap
+        self._owner_keys.setdefault(key[0], set()).add(key)
+        self.current_bytes += cost
+        while self.current_bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+    def _discard(self, key):
+        pixmap = self._entries.pop(key, None)
+        if pixmap is None:
+            return
+        self.current_bytes -= self._cost(pixmap)
+        keys = self._owner_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._owner_keys[key[0]]
+    def invalidate(self, owner):
+        for key in list(self._owner_keys.get(owner, ())):
+            self._discard(key)
+
+PIXMAP_CACHE = PixmapCache()
+_cache_owner_ids = itertools.count()
+
+# Quiet period after the last interactive edit before the smooth-quality re-render.
+SETTLE_MS = 150
 
 class DraggableWidget(QWidget):
     selected = pyqtSignal(object)
@@ -33,6 +86,14 @@ class DraggableWidget(QWidget):
         self._drag_offset = QPoint()
         self.setAttribute(Qt.WA_DeleteOnClose)
         self._image_pixmap = image_pixmap if is_image else None
+        self._cache_owner = next(_cache_owner_ids)
+        # While an interactive edit is in progress frames are drawn with fast
+        # transforms and not cached; _settle_timer restores smooth quality.
+        self._draft = False
+        self._settle_timer = QTimer(self)
+        self._settle_timer.setSingleShot(True)
+        self._settle_timer.setInterval(SETTLE_MS)
+        self._settle_timer.timeout.connect(self._settle)
         if self.is_gif:
             self._original_movie = None
             self._connect_gif_frame_updater()
@@ -53,75 +114,76 @@ class DraggableWidget(QWidget):
         new_w = orig_w * cos_a + orig_h * sin_a
         new_h = orig_w * sin_a + orig_h * cos_a
         return int(math.ceil(new_w)), int(math.ceil(new_h))
-    def _update_gif_frame(self):
-        frame = self._original_movie.currentPixmap()
+    def _compose(self, frame):
         orig_w, orig_h = self._current_width, self._current_height
         angle = self._rotation
-        if not frame.isNull():
-            scaled_frame = frame.scaled(
-                orig_w, orig_h,
-                Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-            if angle != 0:
-                transform = QTransform().rotate(angle)
-                rotated_pixmap = scaled_frame.transformed(
-                    transform, Qt.SmoothTransformation)
-                bbox_w, bbox_h = self._bounding_box_size(orig_w, orig_h, angle)
-                self._label.setFixedSize(bbox_w, bbox_h)
-                composed_pixmap = QPixmap(bbox_w, bbox_h)
-                composed_pixmap.fill(Qt.transparent)
-                p = QPainter(composed_pixmap)
-                x = (bbox_w - rotated_pixmap.width()) // 2
-                y = (bbox_h - rotated_pixmap.height()) // 2
-                p.drawPixmap(x, y, rotated_pixmap)
-                p.end()
-                self._label.setPixmap(composed_pixmap)
-                self.setFixedSize(bbox_w, bbox_h)
-            else:
-                self._label.setFixedSize(orig_w, orig_h)
-                self._label.setPixmap(scaled_frame)
-                self.setFixedSize(orig_w, orig_h)
+        mode = Qt.FastTransformation if self._draft else Qt.SmoothTransformation
+        scaled_frame = frame.scaled(orig_w, orig_h, Qt.IgnoreAspectRatio, mode)
+        if angle == 0:
+            return scaled_frame
+        transform = QTransform().rotate(angle)
+        rotated_pixmap = scaled_frame.transformed(transform, mode)
+        bbox_w, bbox_h = self._bounding_box_size(orig_w, orig_h, angle)
+        composed_pixmap = QPixmap(bbox_w, bbox_h)
+        composed_pixmap.fill(Qt.transparent)
+        p = QPainter(composed_pixmap)
+        x = (bbox_w - rotated_pixmap.width()) // 2
+        y = (bbox_h - rotated_pixmap.height()) // 2
+        p.drawPixmap(x, y, rotated_pixmap)
+        p.end()
+        return composed_pixmap
+    def _show(self, composed_pixmap):
+        self._label.setFixedSize(composed_pixmap.width(), composed_pixmap.height())
+        self._label.setPixmap(composed_pixmap)
+        self.setFixedSize(composed_pixmap.width(), composed_pixmap.height())
+    def _update_gif_frame(self):
+        key = (self._cache_owner, self._original_movie.currentFrameNumber(),
+               self._current_width, self._current_height, self._rotation)
+        composed_pixmap = None if self._draft else PIXMAP_CACHE.get(key)
+        if composed_pixmap is None:
+            frame = self._original_movie.currentPixmap()
+            if frame.isNull():
+                return
+            composed_pixmap = self._compose(frame)
+            if not self._draft:
+                PIXMAP_CACHE.put(key, composed_pixmap)
+        self._show(composed_pixmap)
     def _update_image_frame(self):
         if self._image_pixmap is None:
             return
-        orig_w, orig_h = self._current_width, self._current_height
-        angle = self._rotation
-        scaled_frame = self._image_pixmap.scaled(
-            orig_w, orig_h,
-            Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-        if angle != 0:
-            transform = QTransform().rotate(angle)
-            rotated_pixmap = scaled_frame.transformed(transform, Qt.SmoothTransformation)
-            bbox_w, bbox_h = self._bounding_box_size(orig_w, orig_h, angle)
-            self._label.setFixedSize(bbox_w, bbox_h)
-            composed_pixmap = QPixmap(bbox_w, bbox_h)
-            composed_pixmap.fill(Qt.transparent)
-            p = QPainter(composed_pixmap)
-            x = (bbox_w - rotated_pixmap.width()) // 2
-            y = (bbox_h - rotated_pixmap.height()) // 2
-            p.drawPixmap(x, y, rotated_pixmap)
-            p.end()
-            self._label.setPixmap(composed_pixmap)
-            self.setFixedSize(bbox_w, bbox_h)
-        else:
-            self._label.setFixedSize(orig_w, orig_h)
-            self._label.setPixmap(scaled_frame)
-            self.setFixedSize(orig_w, orig_h)
-    def set_new_size(self, width, height):
-        self._current_width = width
-        self._current_height = height
+        self._show(self._compose(self._image_pixmap))
+    def _refresh(self):
         if self.is_gif:
             self._update_gif_frame()
         elif self.is_image:
             self._update_image_frame()
         else:
-            self.setFixedSize(QSize(width, height))
-            self.child_widget.setFixedSize(QSize(width, height))
+            self.setFixedSize(QSize(self._current_width, self._current_height))
+            self.child_widget.setFixedSize(QSize(self._current_width, self._current_height))
+    def set_new_size(self, width, height):
+        if (width, height) != (self._current_width, self._current_height):
+            PIXMAP_CACHE.invalidate(self._cache_owner)
+        self._current_width = width
+        self._current_height = height
+        self._refresh()
     def set_rotation(self, angle_degrees):
+        if angle_degrees != self._rotation:
+            PIXMAP_CACHE.invalidate(self._cache_owner)
         self._rotation = angle_degrees
-        if self.is_gif:
-            self._update_gif_frame()
-        elif self.is_image:
-            self._update_image_frame()
+        if self.is_gif or self.is_image:
+            self._refresh()
+    def set_transform(self, width, height, angle_degrees):
+        """Apply interactive size and rotation changes; a smooth pass follows after SETTLE_MS."""
+        if (width, height, angle_degrees) == (self._current_width, self._current_height, self._rotation):
+            return
+        PIXMAP_CACHE.invalidate(self._cache_owner)
+        self._current_width, self._current_height, self._rotation = width, height, angle_degrees
+        self._draft = True
+        self._refresh()
+        self._settle_timer.start()
+    def _settle(self):
+        self._draft = False
+        self._refresh()
     def set_selected(self, val):
         self.selected_flag = val
         self.update()
@@ -148,6 +210,9 @@ class DraggableWidget(QWidget):
             event.accept()
         else:
             event.ignore()
+    def closeEvent(self, event):
+        PIXMAP_CACHE.invalidate(self._cache_owner)
+        super().closeEvent(event)
     def paintEvent(self, event):
         super().paintEvent(event)
         if self.selected_flag:
@@ -156,8 +221,220 @@ class DraggableWidget(QWidget):
             painter.setPen(pen)
             painter.drawRect(self.rect().adjusted(2, 2, -2, -2))
 
+class CanvasLayer:
+    """One layer of a LayoutCanvas, with DraggableWidget's interface but drawn by the canvas."""
+    def __init__(self, canvas, loader, source_path, is_gif=False, is_image=False):
+        self.canvas = canvas
+        self.loader = loader
+        self.source_path = source_path
+        self.is_gif = is_gif
+        self.is_image = is_image
+        self._x = 0
+        self._y = 0
+        self._current_width = 320
+        self._current_height = 240
+        self._rotation = 0.0
+        self.selected_flag = False
+        self._shown_key = None
+        self._draft = False
+    def x(self):
+        return self._x
+    def y(self):
+        return self._y
+    def item(self):
+        return {'path': self.source_path, 'width': self._current_width, 'height': self._current_height,
+                'rotation_degrees': self._rotation}
+    def rect(self):
+        w, h = DraggableWidget._bounding_box_size(self._current_width, self._current_height, self._rotation)
+        return QRect(self._x, self._y, w, h)
+    def contains(self, point):
+        # Undo the rotation around the layer centre and test against the unrotated size.
+        r = self.rect()
+        dx = point.x() - (r.x() + r.width() / 2)
+        dy = point.y() - (r.y() + r.height() / 2)
+        theta = math.radians(self._rotation)
+        u = dx * math.cos(theta) + dy * math.sin(theta)
+        v = -dx * math.sin(theta) + dy * math.cos(theta)
+        return abs(u) <= self._current_width / 2 and abs(v) <= self._current_height / 2
+    def move(self, x, y):
+        old = self.rect()
+        self._x, self._y = int(x), int(y)
+        self.canvas.mark_dirty(old, self.rect())
+    def set_new_size(self, width, height):
+        old = self.rect()
+        self._current_width, self._current_height = width, height
+        self.canvas.mark_dirty(old, self.rect())
+    def set_rotation(self, angle_degrees):
+        old = self.rect()
+        self._rotation = angle_degrees
+        self.canvas.mark_dirty(old, self.rect())
+    def set_transform(self, width, height, angle_degrees):
+        """Apply interactive size and rotation changes; a smooth pass follows after SETTLE_MS."""
+        if (width, height, angle_degrees) == (self._current_width, self._current_height, self._rotation):
+            return
+        old = self.rect()
+        self._current_width, self._current_height, self._rotation = width, height, angle_degrees
+        self._draft = True
+        self.canvas.mark_dirty(old, self.rect())
+        self.canvas.settle_later(self)
+    def set_selected(self, val):
+        self.selected_flag = val
+        self.canvas.mark_dirty(self.rect())
+    def raise_(self):
+        self.canvas.mark_dirty(self.rect())
+    def lower(self):
+        self.canvas.mark_dirty(self.rect())
+
+class LayoutCanvas(QWidget):
+    """Draws every layer in one widget from a single animation clock.
+
+    Frame ``idx`` shows source frame ``idx`` of every layer, as composite_frame does for export.
+    """
+    layer_selected = pyqtSignal(object)
+    def __init__(self, layers=None, fps=24, parent=None):
+        super().__init__(parent)
+        self.layers = layers if layers is not None else []
+        self.fps = fps
+        self.frame_idx = 0
+        self._loaders = {}
+        self._drag_layer = None
+        self._drag_offset = QPoint()
+        self._start = time.perf_counter()
+        self.setAttribute(Qt.WA_OpaquePaintEvent, False)
+        self.setMinimumSize(400, 300)
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._tick)
+        self._timer.start(max(1, int(1000 / fps)))
+        self._settling = set()
+        self._settle_timer = QTimer(self)
+        self._settle_timer.setSingleShot(True)
+        self._settle_timer.setInterval(SETTLE_MS)
+        self._settle_timer.timeout.connect(self._settle)
+    def _loader(self, path, kind, size=None):
+        # Layers showing the same file (and, for videos, at the same size) share one decoder.
+        key = (path, size)
+        loader = self._loaders.get(key)
+        if loader is None:
+            if kind == 'video':
+                loader = VideoLoader(path, size)
+            else:
+                loader = get_loader({'path': path, 'type': kind})
+            self._loaders[key] = loader
+        return loader
+    def add_layer(self, path, kind, width=320, height=240):
+        loader = self._loader(path, kind, (width, height) if kind == 'video' else None)
+        layer = CanvasLayer(self, loader, path, is_gif=kind == 'gif', is_image=kind == 'image')
+        layer._current_width, layer._current_height = width, height
+        self.layers.append(layer)
+        self.mark_dirty(layer.rect())
+        return layer
+    def mark_dirty(self, *rects):
+        region = QRegion()
+        for rect in rects:
+            region = region.united(rect.adjusted(-1, -1, 1, 1))
+        self.update(region)
+    def settle_later(self, layer):
+        self._settling.add(layer)
+        self._settle_timer.start()
+    def _settle(self):
+        for layer in self._settling:
+            layer._draft = False
+            self.mark_dirty(layer.rect())
+        self._settling.clear()
+    def _tick(self):
+        idx = int((time.perf_counter() - self._start) * self.fps)
+        if idx == self.frame_idx:
+            return
+        self.frame_idx = idx
+        region = QRegion()
+        for layer in self.layers:
+            if layer.loader.num_frames() > 1 and layer.loader.frame_key(idx) != layer._shown_key:
+                region = region.united(layer.rect().adjusted(-1, -1, 1, 1))
+        if not region.isEmpty():
+            self.update(region)
+    def _resize_video(self, layer):
+        # Decode at the settled layer size; drafts scale the old frames meanwhile.
+        size = (layer._current_width, layer._current_height)
+        old = layer.loader
+        layer.loader = self._loader(layer.source_path, 'video', size)
+        if not any(other.loader is old for other in self.layers):
+            old.close()
+            del self._loaders[(layer.source_path, old.size)]
+    def _layer_image(self, layer):
+        item = layer.item()
+        video = isinstance(layer.loader, VideoLoader)
+        if video and not layer._draft and layer.loader.size != (item['width'], item['height']):
+            self._resize_video(layer)
+        frame_key = layer.loader.frame_key(self.frame_idx)
+        # Keyed by source path, so layers sharing a file and geometry share frames;
+        # entries for old sizes and rotations age out of the LRU. Videos already keep
+        # one decoded loop at the layer size, so they stay out of the shared cache.
+        key = (layer.source_path, frame_key, item['width'], item['height'], item['rotation_degrees'])
+        image = None if layer._draft or video else PIXMAP_CACHE.get(key)
+        if image is None:
+            # The preview loops forever; a total past one loop lets videos keep their decoded loop.
+            img = transform_layer(item, layer.loader, self.frame_idx, 2 * layer.loader.num_frames(),
+                                  quality='draft' if layer._draft else 'final')
+            image = QImage(img.tobytes(), img.width, img.height, img.width * 4, QImage.Format_RGBA8888).copy()
+            if not layer._draft and not video:
+                PIXMAP_CACHE.put(key, image)
+        layer._shown_key = frame_key
+        return image
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        region = event.region()
+        for layer in self.layers:
+            rect = layer.rect()
+            if not region.intersects(rect.adjusted(-1, -1, 1, 1)):
+                continue
+            image = self._layer_image(layer)
+            painter.drawImage(rect.x(), rect.y(), image)
+            if layer.selected_flag:
+                painter.setPen(QPen(QColor(0, 120, 215), 4))
+                painter.drawRect(rect.adjusted(2, 2, -2, -2))
+        painter.end()
+    def layer_at(self, point):
+        for layer in reversed(self.layers):
+            if layer.contains(point):
+                return layer
+        return None
+    def mousePressEvent(self, event):
+        layer = self.layer_at(event.pos()) if event.button() == Qt.LeftButton else None
+        if layer is None:
+            event.ignore()
+            return
+        self.layer_selected.emit(layer)
+        self._drag_layer = layer
+        self._drag_offset = event.pos() - QPoint(layer.x(), layer.y())
+        event.accept()
+    def mouseMoveEvent(self, event):
+        layer = self._drag_layer
+        if layer is None:
+            event.ignore()
+            return
+        rect = layer.rect()
+        pos = event.pos() - self._drag_offset
+        layer.move(min(max(0, pos.x()), self.width() - rect.width()),
+                   min(max(0, pos.y()), self.height() - rect.height()))
+        event.accept()
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton and self._drag_layer is not None:
+            self._drag_layer = None
+            event.accept()
+        else:
+            event.ignore()
+    def closeEvent(self, event):
+        self._timer.stop()
+        for loader in self._loaders.values():
+            loader.close()
+        self._loaders.clear()
+        super().closeEvent(event)
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    """Editor window. With ``canvas_mode`` all layers are drawn by one LayoutCanvas
+    instead of a DraggableWidget with its own QMovie or QMediaPlayer each."""
+    def __init__(self, canvas_mode=False):
         super().__init__()
         self.setWindowTitle("Draggable Video & GIF Player (Multi)")
         self.setGeometry(100, 100, 900, 700)
@@ -166,6 +443,10 @@ class MainWindow(QMainWindow):
         self.current_gif = None
         self.selected_widget = None
         self.controls = {}
+        self.canvas = None
+        if canvas_mode:
+            self.canvas = LayoutCanvas(self.draggable_widgets, parent=self)
+            self.canvas.layer_selected.connect(self.set_selected_widget)
         open_button = QPushButton("Open Video/GIF/Image")
         open_button.clicked.connect(self.open_media)
         self.up_button = QPushButton("Bring Forward")
@@ -191,10 +472,16 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.info_label)
         layout.addLayout(button_bar)
         layout.addLayout(self.controls_layout)
-        layout.addStretch(1)
+        if self.canvas is not None:
+            layout.addWidget(self.canvas, 1)
+        else:
+            layout.addStretch(1)
         central_widget = QWidget()
         central_widget.setLayout(layout)
         self.setCentralWidget(central_widget)
+    def closeEvent(self, event):
+        self.export_dialog.cancel_export(wait=True)
+        super().closeEvent(event)
     def add_controls_ui(self):
         self.controls['width'] = QSpinBox()
         self.controls['width'].setRange(100, 1920)
@@ -230,6 +517,15 @@ class MainWindow(QMainWindow):
         angle = self.controls['rotation'].value()
         is_gif = self.is_gif_file(file_path)
         is_image = self.is_image_file(file_path)
+        if self.canvas is not None:
+            try:
+                layer = self.canvas.add_layer(file_path, 'gif' if is_gif else ('image' if is_image else 'video'), w, h)
+            except (OSError, ValueError):
+                return
+            layer.set_rotation(angle)
+            layer.move(20 * (len(self.draggable_widgets) - 1), 20 * (len(self.draggable_widgets) - 1))
+            self.set_selected_widget(layer)
+            return
         if is_gif:
             label = QLabel(self)
             label.setMinimumSize(100, 100)
@@ -283,8 +579,7 @@ class MainWindow(QMainWindow):
         w = self.controls['width'].value()
         h = self.controls['height'].value()
         angle = self.controls['rotation'].value()
-        self.selected_widget.set_new_size(w, h)
-        self.selected_widget.set_rotation(angle)
+        self.selected_widget.set_transform(w, h, angle)
     def bring_forward(self):
         if self.selected_widget is None:
             return
@@ -305,6 +600,52 @@ class MainWindow(QMainWindow):
 
 
 
+# Output formats offered by ExportDialog and their file extensions; None writes a PNG sequence.
+EXPORT_FORMATS = OrderedDict([('PNG sequence', None), ('GIF', '.gif'), ('MP4', '.mp4'), ('WebP', '.webp'),
+                              ('APNG', '.apng')])
+# Longest side of the preview thumbnails sent while exporting, and the least time between two of them.
+EXPORT_THUMBNAIL_SIZE = 160
+EXPORT_THUMBNAIL_INTERVAL = 0.25
+
+class ExportWorker(QThread):
+    """Runs export_sequence off the GUI thread, reporting progress, previews and the outcome as signals."""
+    progress = pyqtSignal(int, int)
+    thumbnail = pyqtSignal(int, QImage)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    def __init__(self, layout_path, frames, output=None, quality='final', workers=1, parent=None):
+        super().__init__(parent)
+        self.layout_path = layout_path
+        self.frames = frames
+        self.output = output
+        self.quality = quality
+        self.workers = workers
+        self._cancel = threading.Event()
+        self._last_thumbnail = None
+    def cancel(self):
+        self._cancel.set()
+    def _on_frame(self, idx, frame):
+        now = time.perf_counter()
+        if self._last_thumbnail is not None and now - self._last_thumbnail < EXPORT_THUMBNAIL_INTERVAL:
+            return
+        self._last_thumbnail = now
+        thumb = frame.convert('RGBA') if frame.mode != 'RGBA' else frame.copy()
+        thumb.thumbnail((EXPORT_THUMBNAIL_SIZE, EXPORT_THUMBNAIL_SIZE))
+        image = QImage(thumb.tobytes(), thumb.width, thumb.height, thumb.width * 4, QImage.Format_RGBA8888).copy()
+        self.thumbnail.emit(idx, image)
+    def run(self):
+        try:
+            summary = export_sequence(self.layout_path, self.frames, workers=self.workers, output=self.output,
+                                      quality=self.quality, progress=self.progress.emit,
+                                      cancel=self._cancel.is_set, on_frame=self._on_frame)
+        except ExportCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(f"{type(e).__name__}: {e}")
+        else:
+            self.succeeded.emit(summary)
+
 class ExportDialog(QDialog):
 
     def __init__(self, parent=None):
@@ -314,6 +655,8 @@ class ExportDialog(QDialog):
         self.draggable_widgets = parent.draggable_widgets
         self.controls = {}
         self.controls_layout = QFormLayout()
+        self.worker = None
+        self._started = None
 
         self.controls['width'] = QSpinBox()
         self.controls['width'].setRange(100, 1920)
@@ -324,19 +667,45 @@ class ExportDialog(QDialog):
         self.controls['frames'] = QSpinBox()
         self.controls['frames'].setRange(5, 1200)
         self.controls['frames'].setValue(48)
+        self.controls['quality'] = QComboBox()
+        self.controls['quality'].addItems(QUALITY_TIERS)
+        self.controls['quality'].setCurrentText('final')
+        self.controls['format'] = QComboBox()
+        self.controls['format'].addItems(list(EXPORT_FORMATS))
+        self.controls['workers'] = QSpinBox()
+        self.controls['workers'].setRange(1, os.cpu_count() or 1)
+        self.controls['workers'].setValue(1)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setValue(0)
+        self.status_label = QLabel("")
+        self.status_label.setWordWrap(True)
+        self.preview_label = QLabel()
+        self.preview_label.setAlignment(Qt.AlignCenter)
+        self.preview_label.setMinimumHeight(EXPORT_THUMBNAIL_SIZE)
         
         layout = QVBoxLayout()
         button_bar = QHBoxLayout()
         self.export_button = QPushButton("Export")
         self.export_button.clicked.connect(self.export_layout)
         button_bar.addWidget(self.export_button)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(lambda: self.cancel_export())
+        button_bar.addWidget(self.cancel_button)
 
 
         self.controls_layout.addRow("Width:", self.controls['width'])
         self.controls_layout.addRow("Height:", self.controls['height'])
         self.controls_layout.addRow("Frames:", self.controls['frames'])
+        self.controls_layout.addRow("Quality:", self.controls['quality'])
+        self.controls_layout.addRow("Format:", self.controls['format'])
+        self.controls_layout.addRow("Workers:", self.controls['workers'])
 
         layout.addLayout(self.controls_layout)
+        layout.addWidget(self.preview_label)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.status_label)
         layout.addStretch(1)
         layout.addLayout(button_bar)
         central_widget = QWidget()
@@ -344,6 +713,8 @@ class ExportDialog(QDialog):
         self.setLayout(layout)
         
     def export_layout(self):
+        if self.worker is not None:
+            return
         export_data = []
         for order, widget in enumerate(self.draggable_widgets):
             entry = {
@@ -359,29 +730,73 @@ class ExportDialog(QDialog):
             export_data.append(entry)
         
         min_x, min_y, max_x, max_y = compute_content_bounding_box(export_data)
-        x_scale = (max_x - min_x) / self.controls['width'].value()
-        y_scale = (max_y - min_y) / self.controls['height'].value()
+        x_scale = self.controls['width'].value() / (max_x - min_x)
+        y_scale = self.controls['height'].value() / (max_y - min_y)
 
+        # Edges are scaled from the content's corner and rounded, so the layout spans the requested size.
         for entry in export_data:
-            entry['x'] = int(entry['x'] * x_scale)
-            entry['width'] = int(entry['width'] * x_scale)
-            entry['y'] = int(entry['y'] * y_scale)
-            entry['height'] = int(entry['height'] * y_scale)
+            left = min_x + round((entry['x'] - min_x) * x_scale)
+            top = min_y + round((entry['y'] - min_y) * y_scale)
+            entry['width'] = min_x + round((entry['x'] + entry['width'] - min_x) * x_scale) - left
+            entry['height'] = min_y + round((entry['y'] + entry['height'] - min_y) * y_scale) - top
+            entry['x'], entry['y'] = left, top
 
 
 
         file_dialog = QFileDialog(self)
         save_path, _ = file_dialog.getSaveFileName(self, "Export Layout JSON and Sequence", "layout_export.json","JSON Files (*.json)")
-        if save_path:
-            with open(save_path, "w") as f:
-                json.dump(export_data, f, indent=2)
-        self.hide()
+        if not save_path:
+            return
+        with open(save_path, "w") as f:
+            json.dump(export_data, f, indent=2)
+        ext = EXPORT_FORMATS[self.controls['format'].currentText()]
+        output = os.path.splitext(save_path)[0] + ext if ext else None
+        self.worker = ExportWorker(save_path, self.controls['frames'].value(), output,
+                                   self.controls['quality'].currentText(), self.controls['workers'].value(), self)
+        self.worker.progress.connect(self._show_progress)
+        self.worker.thumbnail.connect(self._show_thumbnail)
+        self.worker.succeeded.connect(self._export_succeeded)
+        self.worker.failed.connect(lambda message: self._export_done(f"Export failed: {message}"))
+        self.worker.cancelled.connect(lambda: self._export_done("Export cancelled"))
+        self.export_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.progress_bar.setValue(0)
+        self.preview_label.clear()
+        self.status_label.setText("Starting export...")
+        self._started = time.perf_counter()
+        self.worker.start()
+    def _show_progress(self, done, total):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        elapsed = time.perf_counter() - self._started
+        eta = elapsed * (total - done) / done if done else 0.0
+        self.status_label.setText(f"{done}/{total} frames, {elapsed:.0f}s elapsed, about {eta:.0f}s left")
+    def _show_thumbnail(self, idx, image):
+        self.preview_label.setPixmap(QPixmap.fromImage(image))
+    def _export_succeeded(self, summary):
+        self._export_done(f"Saved {summary['frames']} frames to {summary['output']} "
+                          f"in {summary['wall_seconds']:.1f}s")
+    def _export_done(self, message):
+        self.worker.wait()
+        self.worker = None
+        self.status_label.setText(message)
+        self.export_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+    def cancel_export(self, wait=False):
+        """Ask a running export to stop; with ``wait`` block until it has."""
+        if self.worker is None:
+            return
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText("Cancelling...")
+        self.worker.cancel()
+        if wait:
+            self.worker.wait()
 
 
 
 def main():
     app = QApplication(sys.argv)
-    win = MainWindow()
+    win = MainWindow(canvas_mode='--canvas' in sys.argv[1:])
     win.show()
     sys.exit(app.exec_())
 
@@ -1,7 +1,18 @@
+import bisect
+import contextlib
+import itertools
 import json
+import logging
+import math
 import os
+import time
+from collections import OrderedDict
+from fractions import Fraction
+import numpy as np
 from PIL import Image, ImageOps
 import imageio.v2 as imageio_v2
+from frame_writers import ANIMATED_FORMATS, LINK_MODES, PngSequenceWriter, ThreadedWriter, open_writer
+from export_profiler import NULL_PROFILER, ExportProfiler
 
 SUPPORTED_IMAGE_FORMATS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff'}
 SUPPORTED_VIDEO_FORMATS = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv'}
@@ -10,62 +21,325 @@ def parse_layout(json_path):
     with open(json_path, 'r') as f:
         return json.load(f)
 
+# GIFs whose fully decoded RGBA frames exceed this are decoded lazily by default.
+EAGER_GIF_MAX_BYTES = 64 * 1024 * 1024
+# Upper bound on one decoded loop of a video kept for wrap-around.
+VIDEO_LOOP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
 class StaticImageLoader:
     def __init__(self, path):
         self.path = path
         self.img = Image.open(path).convert('RGBA')
-    def get_frame(self, idx=None, total=None):
-        return self.img.copy()
+    def get_frame(self, idx=None, total=None, copy=True):
+        return self.img.copy() if copy else self.img
+    def frame_key(self, idx):
+        return (self.path, 0)
     def num_frames(self):
         return 1
+    def durations(self):
+        return None
+    def close(self):
+        pass
+
+# GIF frame durations at or below this many ms play as GIF_DEFAULT_DURATION_MS, as in browsers.
+GIF_MIN_DURATION_MS = 10
+GIF_DEFAULT_DURATION_MS = 100
 
 class GifLoader:
-    def __init__(self, path):
+    """Loads GIF frames as RGBA images, up front or lazily with a small window of recent frames."""
+    def __init__(self, path, lazy=None, window=16):
         self.path = path
         self._frames = []
+        self._durations = None
+        self._im = None
+        with Image.open(path) as im:
+            self.length = getattr(im, 'n_frames', 1)
+            decoded_bytes = self.length * im.width * im.height * 4
+        if lazy is None:
+            lazy = decoded_bytes > EAGER_GIF_MAX_BYTES
+        self.lazy = lazy
+        self.window = max(1, window)
+        if lazy:
+            self._window = OrderedDict()
+            return
+        durations = []
         with Image.open(path) as im:
             try:
                 while True:
                     self._frames.append(im.convert('RGBA').copy())
+                    durations.append(im.info.get('duration'))
                     im.seek(im.tell() + 1)
             except EOFError:
                 pass
         self.length = len(self._frames)
-    def get_frame(self, idx, total):
+        self._durations = [self._duration(d) for d in durations]
+    @staticmethod
+    def _duration(ms):
+        return ms if ms and ms > GIF_MIN_DURATION_MS else GIF_DEFAULT_DURATION_MS
+    def _decode(self, frame_idx):
+        frame = self._window.get(frame_idx)
+        if frame is not None:
+            self._window.move_to_end(frame_idx)
+            return frame
+        if self._im is None:
+            self._im = Image.open(self.path)
+        # Seeking forward continues from the current frame; seeking backward
+        # makes PIL restart from frame 0, which only happens on loop wrap.
+        self._im.seek(frame_idx)
+        frame = self._im.convert('RGBA')
+        self._window[frame_idx] = frame
+        if len(self._window) > self.window:
+            self._window.popitem(last=False)
+        return frame
+    def get_frame(self, idx, total, copy=True):
         if self.length == 0:
             return Image.new('RGBA', (1, 1), (0,0,0,0))
         frame_idx = idx % self.length
-        return self._frames[frame_idx].copy()
+        if self.lazy:
+            frame = self._decode(frame_idx)
+        else:
+            frame = self._frames[frame_idx]
+        return frame.copy() if copy else frame
+    def frame_key(self, idx):
+        return (self.path, idx % self.length if self.length else 0)
     def num_frames(self):
         return self.length
+    def durations(self):
+        """Display time of each frame in ms; read from the frame headers on first use in lazy mode."""
+        if self._durations is None:
+            durations = []
+            with Image.open(self.path) as im:
+                for idx in range(self.length):
+                    im.seek(idx)
+                    durations.append(self._duration(im.info.get('duration')))
+            self._durations = durations
+        return self._durations
+    def close(self):
+        if self._im is not None:
+            self._im.close()
+            self._im = None
+
+@contextlib.contextmanager
+def _quiet_ffmpeg():
+    # Decoding straight to the layer size is intended, but imageio_ffmpeg
+    # warns about it each time it starts ffmpeg (opening and seeking).
+    logger = logging.getLogger('imageio_ffmpeg')
+    level = logger.level
+    logger.setLevel(logging.ERROR)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
 
 class VideoLoader:
-    def __init__(self, path):
+    """Decodes video frames forward in a single ffmpeg pass, at ``size`` when given.
+
+    The first loop is kept for wrap-around, and is shortened if the container over-reported its frames.
+    """
+    def __init__(self, path, size=None, cache_loop=True):
         self.path = path
-        self.reader = imageio_v2.get_reader(path, 'ffmpeg')
+        self.size = tuple(size) if size else None
+        self.cache_loop = cache_loop
+        self._kwargs = {}
+        if self.size:
+            self._kwargs = {'size': self.size, 'output_params': ['-sws_flags', 'lanczos']}
+        self.reader = self._open_reader()
+        meta = self.reader.get_meta_data()
+        self.fps = meta.get('fps') or 0
+        duration = meta.get('duration') or 0
+        if self.fps > 0 and duration > 0:
+            self.length = max(1, int(round(duration * self.fps)))
+        else:
+            try:
+                self.length = self.reader.count_frames()
+            except Exception:
+                self.length = 1
+        self._pos = -1
+        self._last = None
+        self._loop = None
+        self._verified = False
+    def _open_reader(self):
+        with _quiet_ffmpeg():
+            return imageio_v2.get_reader(self.path, 'ffmpeg', **self._kwargs)
+    def _read(self, frame_idx):
+        if frame_idx == self._pos:
+            return self._last
+        if frame_idx == self._pos + 1:
+            frame = self.reader.get_next_data()
+        else:
+            with _quiet_ffmpeg():
+                frame = self.reader.get_data(frame_idx)
+        self._pos = frame_idx
+        self._last = Image.fromarray(frame).convert('RGBA')
+        return self._last
+    def _count_frames(self, limit):
         try:
-            self.length = self.reader.count_frames()
+            return max(1, min(limit, self.reader.count_frames()))
         except Exception:
-            self.length = 1
-    def get_frame(self, idx, total):
-        frame_idx = idx % self.length
+            return limit
+    def _frame(self, frame_idx):
+        if self._loop is not None and self._loop[frame_idx] is not None:
+            return self._loop[frame_idx]
         try:
-            frame = self.reader.get_data(frame_idx)
+            img = self._read(frame_idx)
         except Exception:
-            frame = self.reader.get_data(0)
-        img = Image.fromarray(frame)
-        return img.convert('RGBA')
+            if frame_idx == 0:
+                raise
+            # Container metadata over-reported the frame count; shrink the loop.
+            # Reading forward, the failed frame is the end; after a seek it only bounds it.
+            self.length = frame_idx if frame_idx == self._pos + 1 else self._count_frames(frame_idx)
+            self._verified = True
+            # The failed read leaves the reader's stream exhausted; start a fresh one.
+            self.reader.close()
+            self.reader = self._open_reader()
+            self._pos = -1
+            if self._loop is not None:
+                self._loop = self._loop[:self.length]
+            return self._frame(frame_idx % self.length)
+        if frame_idx == self.length - 1:
+            self._verified = True
+        if self._loop is not None:
+            self._loop[frame_idx] = img
+        return img
+    def _check_wrap(self, idx):
+        if idx >= self.length and not self._verified:
+            # Wrapping at an unchecked length would show the wrong frames; confirm it first.
+            self._frame(self.length - 1)
+    def get_frame(self, idx, total, copy=True):
+        self._check_wrap(idx)
+        if self._loop is None and self.cache_loop and total and total > self.length:
+            w, h = self.size or self.reader.get_meta_data()['size']
+            if self.length * w * h * 4 <= VIDEO_LOOP_CACHE_MAX_BYTES:
+                self._loop = [None] * self.length
+        img = self._frame(idx % self.length)
+        return img.copy() if copy else img
+    def frame_key(self, idx):
+        self._check_wrap(idx)
+        return (self.path, self.size, idx % self.length)
     def num_frames(self):
         return self.length
+    def durations(self):
+        return [1000 / self.fps] * self.length if self.fps > 0 else None
+    def close(self):
+        self.reader.close()
+
+# Timelines repeating within this many output frames get a lookup table; longer ones bisect.
+TIMELINE_TABLE_MAX = 1 << 20
+
+class TimedLoader:
+    """Shows a layer's source frames for their own durations at an output frame rate, with exact timing."""
+    def __init__(self, loader, fps):
+        self.loader = loader
+        self.path = getattr(loader, 'path', None)
+        self.fps = Fraction(fps).limit_denominator(1001)
+        self._build()
+    def _build(self):
+        self._length = self.loader.num_frames()
+        durations = [Fraction(d).limit_denominator(1000) for d in self.loader.durations()[:self._length]]
+        scale = math.lcm(self.fps.numerator, *(d.denominator for d in durations))
+        self._ends = list(itertools.accumulate(int(d * scale) for d in durations))
+        self._loop = self._ends[-1]
+        self._step = int(1000 / self.fps * scale)
+        self.loop_frames = -(-self._loop // self._step)
+        self.period = self._loop // math.gcd(self._loop, self._step)
+        self._table = None
+        if self.period <= TIMELINE_TABLE_MAX:
+            table = []
+            k = t = 0
+            for _ in range(self.period):
+                while self._ends[k] <= t:
+                    k += 1
+                table.append(k)
+                t += self._step
+                if t >= self._loop:
+                    t %= self._loop
+                    k = 0
+            self._table = table
+    def _sync(self):
+        if self.loader.num_frames() != self._length:
+            # The wrapped loader shrank its frame count; rebuild the timeline.
+            self._build()
+    def source_index(self, idx):
+        self._sync()
+        idx %= self.period
+        if self._table is not None:
+            return self._table[idx]
+        return bisect.bisect_right(self._ends, idx * self._step % self._loop)
+    def get_frame(self, idx, total=None, copy=True):
+        # ``total`` is in output frames; the loader compares it with its own length.
+        if total:
+            total = -(-total * self._length // self.loop_frames)
+        return self.loader.get_frame(self.source_index(idx), total, copy)
+    def frame_key(self, idx):
+        return self.loader.frame_key(self.source_index(idx))
+    def num_frames(self):
+        self._sync()
+        return self.period
+    def close(self):
+        self.loader.close()
+
+def timed_loader(loader, fps):
+    """Wrap ``loader`` in a TimedLoader at ``fps``; stills and untimed sources are returned as they are."""
+    if loader.num_frames() <= 1 or not loader.durations():
+        return loader
+    return TimedLoader(loader, fps)
+
+class TransformCache:
+    """LRU cache of transformed layer images under a byte budget; cached values must not be mutated."""
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+    @staticmethod
+    def _cost(img):
+        if isinstance(img, np.ndarray):
+            return img.nbytes
+        return img.width * img.height * len(img.getbands())
+    def get(self, key):
+        img = self._entries.get(key)
+        if img is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return img
+    def put(self, key, img):
+        cost = self._cost(img)
+        if cost > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= self._cost(old)
+        self._entries[key] = img
+        self.current_bytes += cost
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= self._cost(evicted)
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+        }
 
 # FIX: Add get_loader definition (was missing)
-def get_loader(item):
+def get_loader(item, lazy_gif=None, assets=None):
+    if assets is not None:
+        # An asset_cache.AssetCache shares decoded frames between layers and runs.
+        return assets.open(item, lazy_gif)
     path = item['path']
     ext = os.path.splitext(path)[1].lower()
     if item['type'] == 'gif' or ext == '.gif':
-        return GifLoader(path)
+        return GifLoader(path, lazy=lazy_gif)
     elif item['type'] == 'video' or ext in SUPPORTED_VIDEO_FORMATS:
-        return VideoLoader(path)
+        return VideoLoader(path, size=(item['width'], item['height']))
     elif item['type'] == 'image' or ext in SUPPORTED_IMAGE_FORMATS:
         return StaticImageLoader(path)
     else:
@@ -107,50 +381,827 @@ def compute_content_bounding_box(layout_items):
     max_x, max_y = int(max_x), int(max_y)
     return min_x, min_y, max_x, max_y
 
-def composite_frame(layout_items, loaders, frame_idx, total_frames, min_x, min_y, canvas_size):
-    canvas = Image.new('RGBA', canvas_size, (255,255,255,0))
+# Resampling tiers for layer transforms: 'draft' favours speed, 'final' quality.
+QUALITY_TIERS = ('draft', 'final')
+# (resize filter, affine filter) per tier.
+_RESAMPLE = {'draft': (Image.NEAREST, Image.BILINEAR), 'final': (Image.LANCZOS, Image.BICUBIC)}
+
+def _affine_source(img, w, h, angle, quality):
+    """Plan scaling ``img`` to w x h and rotating it by ``angle`` as one resampling pass.
+
+    Returns (source, matrix, supersample) for _affine_window, or None for right angles.
+    """
+    size, matrix = rotate_geometry(w, h, angle)
+    if matrix is None:
+        return None
+    sw, sh = img.size
+    if quality == 'final' and (sw < w or sh < h):
+        return img.resize((w, h), resample=Image.LANCZOS), matrix, 1
+    ss = 2 if quality == 'final' and max(sw / w, sh / h) >= 2 else 1
+    kx, ky = max(1, int(sw / w / ss)), max(1, int(sh / h / ss))
+    if kx > 1 or ky > 1:
+        img = img.reduce((kx, ky))
+    sx, sy = sw / kx / w / ss, sh / ky / h / ss
+    a, b, c, d, e, f = matrix
+    return img, (a * sx, b * sx, c * sx * ss, d * sy, e * sy, f * sy * ss), ss
+
+def _affine_window(source, box, resample):
+    """Render the ``box`` part of a rotated layer's output from an _affine_source plan."""
+    img, (a, b, c, d, e, f), ss = source
+    x0, y0, x1, y1 = box[0] * ss, box[1] * ss, box[2] * ss, box[3] * ss
+    out = img.transform((x1 - x0, y1 - y0), Image.AFFINE, (a, b, a * x0 + b * y0 + c, d, e, d * x0 + e * y0 + f),
+                        resample=resample)
+    return out.reduce(ss) if ss > 1 else out
+
+def transform_layer(item, loader, frame_idx, total_frames, cache=None, profiler=NULL_PROFILER, quality='final',
+                    rotate=True):
+    """Scale and rotate one layer frame, resampling the source only once."""
+    w, h = item['width'], item['height']
+    angle = item.get('rotation_degrees', 0) if rotate else 0
+    if cache is not None:
+        key = (loader.frame_key(frame_idx), w, h, angle, quality)
+        img = cache.get(key)
+        if img is not None:
+            profiler.record('cache_hit', 0.0, item, frame_idx)
+            return img
+    with profiler.timer('decode', item, frame_idx):
+        img = loader.get_frame(frame_idx, total_frames, copy=False)
+    resize_filter, affine_filter = _RESAMPLE[quality]
+    size, matrix = rotate_geometry(w, h, angle) if angle else ((w, h), None)
+    if matrix is not None:
+        with profiler.timer('affine', item, frame_idx) as t:
+            img = _affine_window(_affine_source(img, w, h, angle, quality), (0, 0) + size, affine_filter)
+            t.nbytes = TransformCache._cost(img)
+    else:
+        if img.size != (w, h):
+            with profiler.timer('resize', item, frame_idx) as t:
+                img = img.resize((w, h), resample=resize_filter)
+                t.nbytes = TransformCache._cost(img)
+        if angle:
+            # Right angles only: a lossless transpose.
+            with profiler.timer('rotate', item, frame_idx) as t:
+                img = img.rotate(-angle, expand=True)
+                t.nbytes = TransformCache._cost(img)
+    if cache is not None:
+        cache.put(key, img)
+    return img
+
+class PlateLoader:
+    """Loader for a plate: a run of consecutive still layers composited once."""
+    def __init__(self, img, key, base=False):
+        self.img = img
+        self.path = key
+        self.base = base
+    def get_frame(self, idx=None, total=None, copy=True):
+        return self.img.copy() if copy else self.img
+    def frame_key(self, idx):
+        return ('plate', self.path)
+    def num_frames(self):
+        return 1
+    def close(self):
+        pass
+
+def _paste_position(item, min_x, min_y):
+    return int(item['x'] - min_x), int(item['y'] - min_y)
+
+def _make_plate(run, min_x, min_y, canvas_size, base, key, quality='final'):
+    placed = [(transform_layer(item, loader, 0, 1, quality=quality), _paste_position(item, min_x, min_y))
+              for item, loader in run]
+    if base:
+        plate = Image.new('RGBA', canvas_size, (255,255,255,0))
+        left = top = 0
+    else:
+        left = min(x for _, (x, y) in placed)
+        top = min(y for _, (x, y) in placed)
+        right = max(x + img.width for img, (x, y) in placed)
+        bottom = max(y + img.height for img, (x, y) in placed)
+        plate = Image.new('RGBA', (right - left, bottom - top), (0,0,0,0))
+    for img, (x, y) in placed:
+        plate.alpha_composite(img, (x - left, y - top))
+    item = {'path': key, 'type': 'image', 'x': left + min_x, 'y': top + min_y,
+            'width': plate.width, 'height': plate.height, 'rotation_degrees': 0, 'order': run[0][0]['order']}
+    return item, PlateLoader(plate, key, base=base)
+
+def plan_layers(layout_items, loaders, min_x, min_y, canvas_size, quality='final'):
+    """Sort layers by ``order`` once and flatten runs of still layers into plates.
+
+    Only the base plate is exact; higher plates may differ by PIL's per-blend rounding.
+    """
     ordered = sorted(zip(layout_items, loaders), key=lambda x: x[0]['order'])
+    steps = []
+    run = []
+    def flush():
+        if run and (not steps or len(run) > 1):
+            steps.append(_make_plate(run, min_x, min_y, canvas_size, base=not steps, key=f'<plate {len(steps)}>',
+                                     quality=quality))
+        else:
+            steps.extend(run)
+        run.clear()
     for item, loader in ordered:
-        img = loader.get_frame(frame_idx, total_frames)
-        w, h = item['width'], item['height']
-        angle = item.get('rotation_degrees', 0)
-        img = img.resize((w, h), resample=Image.LANCZOS)
-        if angle:
-            img = img.rotate(-angle, expand=True, resample=Image.BICUBIC)
-        x, y = item['x'], item['y']
-        paste_x, paste_y = int(x - min_x), int(y - min_y)
-        canvas.alpha_composite(img, (paste_x, paste_y))
+        if loader.num_frames() == 1:
+            run.append((item, loader))
+        else:
+            flush()
+            steps.append((item, loader))
+    flush()
+    return steps
+
+def _base_plate(steps):
+    if steps and isinstance(steps[0][1], PlateLoader) and steps[0][1].base:
+        return steps[0][1].img, steps[1:]
+    return None, steps
+
+class HeldFrames:
+    """The last transformed image of each layer, reused while the layer shows the same source frame."""
+    def __init__(self):
+        self._held = {}
+    def get(self, item, loader, frame_idx):
+        held = self._held.get(id(item))
+        if held is not None and held[0] == loader.frame_key(frame_idx):
+            return held[1]
+        return None
+    def put(self, item, loader, frame_idx, img):
+        self._held[id(item)] = (loader.frame_key(frame_idx), img)
+
+def composite_frame(layout_items, loaders, frame_idx, total_frames, min_x, min_y, canvas_size, cache=None, plan=None,
+                    profiler=NULL_PROFILER, quality='final', held=None):
+    if plan is None:
+        plan = sorted(zip(layout_items, loaders), key=lambda x: x[0]['order'])
+    base, steps = _base_plate(plan)
+    with profiler.timer('canvas', frame=frame_idx) as t:
+        canvas = base.copy() if base is not None else Image.new('RGBA', canvas_size, (255,255,255,0))
+        t.nbytes = TransformCache._cost(canvas)
+    for item, loader in steps:
+        img = held.get(item, loader, frame_idx) if held is not None else None
+        if img is None:
+            img = transform_layer(item, loader, frame_idx, total_frames, cache, profiler, quality)
+            if held is not None:
+                held.put(item, loader, frame_idx, img)
+        else:
+            profiler.record('held', 0.0, item, frame_idx)
+        with profiler.timer('blend', item, frame_idx):
+            canvas.alpha_composite(img, _paste_position(item, min_x, min_y))
     return canvas
 
-def export_sequence(path, frames):
+def rotate_geometry(w, h, angle):
+    """Output size and affine matrix of ``img.rotate(-angle, expand=True)`` for a w x h image.
+
+    The matrix maps output to source pixels, and is None for right angles.
+    """
+    pil_angle = -angle % 360.0
+    if pil_angle in (0, 180):
+        return (w, h), None
+    if pil_angle in (90, 270):
+        return (h, w), None
+    theta = -math.radians(pil_angle)
+    a, b = round(math.cos(theta), 15), round(math.sin(theta), 15)
+    d, e = round(-math.sin(theta), 15), round(math.cos(theta), 15)
+    cx, cy = w / 2, h / 2
+    c = a * -cx + b * -cy + cx
+    f = d * -cx + e * -cy + cy
+    xs = [a * x + b * y + c for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    ys = [d * x + e * y + f for x, y in ((0, 0), (w, 0), (w, h), (0, h))]
+    nw = math.ceil(max(xs)) - math.floor(min(xs))
+    nh = math.ceil(max(ys)) - math.floor(min(ys))
+    ox, oy = -(nw - w) / 2.0, -(nh - h) / 2.0
+    return (nw, nh), (a, b, a * ox + b * oy + c, d, e, d * ox + e * oy + f)
+
+def _window_source(item, loader, frame_idx, total_frames, angle, quality, cache, profiler):
+    """Return what windows of a rotated layer are rendered from: an _affine_source
+    plan, or the resized layer for right angles."""
+    w, h = item['width'], item['height']
+    if rotate_geometry(w, h, angle)[1] is None:
+        return transform_layer(item, loader, frame_idx, total_frames, cache, profiler, quality, rotate=False)
+    with profiler.timer('decode', item, frame_idx):
+        img = loader.get_frame(frame_idx, total_frames, copy=False)
+    with profiler.timer('affine', item, frame_idx):
+        return _affine_source(img, w, h, angle, quality)
+
+def _rotated_window(source, angle, box, resample):
+    if isinstance(source, Image.Image):
+        return source.rotate(-angle, expand=True).crop(box)
+    return _affine_window(source, box, resample)
+
+def iter_frame_strips(layout_items, loaders, frame_idx, total_frames, min_x, min_y, canvas_size, tile_rows,
+                      cache=None, plan=None, profiler=NULL_PROFILER, quality='final'):
+    """Yield (top, strip) pairs of ``tile_rows`` rows that stack into composite_frame's result."""
+    if plan is None:
+        plan = sorted(zip(layout_items, loaders), key=lambda x: x[0]['order'])
+    width, height = canvas_size
+    affine_filter = _RESAMPLE[quality][1]
+    layers = []
+    for item, loader in plan:
+        angle = item.get('rotation_degrees', 0)
+        size = rotate_geometry(item['width'], item['height'], angle)[0] if angle else (item['width'], item['height'])
+        layers.append((item, loader, angle, _paste_position(item, min_x, min_y), size))
+    sources = {}
+    for top in range(0, height, tile_rows):
+        bottom = min(top + tile_rows, height)
+        with profiler.timer('canvas', frame=frame_idx) as t:
+            strip = Image.new('RGBA', (width, bottom - top), (255,255,255,0))
+            t.nbytes = TransformCache._cost(strip)
+        for i, (item, loader, angle, (x, y), (ow, oh)) in enumerate(layers):
+            # The part of the layer's output covered by this strip, in layer coordinates.
+            box = (max(0, -x), max(0, top - y), min(ow, width - x), min(oh, bottom - y))
+            if box[0] >= box[2] or box[1] >= box[3]:
+                continue
+            if angle:
+                key = ('window', loader.frame_key(frame_idx), item['width'], item['height'], angle, quality, box)
+                window = cache.get(key) if cache is not None else None
+                if window is None:
+                    source = sources.get(i)
+                    if source is None:
+                        source = sources[i] = _window_source(item, loader, frame_idx, total_frames, angle, quality,
+                                                             cache, profiler)
+                    with profiler.timer('affine', item, frame_idx) as t:
+                        window = _rotated_window(source, angle, box, affine_filter)
+                        t.nbytes = TransformCache._cost(window)
+                    if cache is not None:
+                        cache.put(key, window)
+                with profiler.timer('blend', item, frame_idx):
+                    strip.alpha_composite(window, (x + box[0], y + box[1] - top))
+            else:
+                img = sources.get(i)
+                if img is None:
+                    img = sources[i] = transform_layer(item, loader, frame_idx, total_frames, cache, profiler, quality,
+                                                       rotate=False)
+                with profiler.timer('blend', item, frame_idx):
+                    strip.alpha_composite(img, (x + box[0], y + box[1] - top), box)
+            if y + oh <= bottom:
+                sources.pop(i, None)
+        yield top, strip
+
+def premultiply(img):
+    arr = np.asarray(img, dtype=np.float32)
+    out = np.empty_like(arr)
+    alpha = arr[..., 3] * (1.0 / 255.0)
+    np.multiply(arr[..., :3], alpha[..., None], out=out[..., :3])
+    out[..., 3] = alpha
+    return out
+
+class NumpyCompositor:
+    """Blends layers into a reused premultiplied-alpha float32 canvas, rounding once at the end."""
+    def __init__(self, canvas_size):
+        w, h = canvas_size
+        self.size = (w, h)
+        self.buffer = np.zeros((h, w, 4), np.float32)
+        self._out = np.empty((h, w, 4), np.uint8)
+        self._scratch = np.empty((h, w), np.float32)
+    def reset(self):
+        self.buffer.fill(0.0)
+    def blend(self, src, x, y):
+        h, w = src.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self.size[0]), min(y + h, self.size[1])
+        if x0 >= x1 or y0 >= y1:
+            return
+        src = src[y0 - y:y1 - y, x0 - x:x1 - x]
+        dst = self.buffer[y0:y1, x0:x1]
+        inv = self._scratch[:y1 - y0, :x1 - x0]
+        np.subtract(1.0, src[..., 3], out=inv)
+        dst *= inv[..., None]
+        dst += src
+    def to_array(self):
+        """Un-premultiply into the reused uint8 RGBA buffer and return it."""
+        alpha = self.buffer[..., 3]
+        out = self._out
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rgb = self.buffer[..., :3] / alpha[..., None]
+        # Uncovered pixels keep composite_frame's transparent white background.
+        rgb[alpha <= 0] = 255.0
+        np.clip(rgb + 0.5, 0, 255, out=rgb)
+        out[..., :3] = rgb
+        out[..., 3] = np.clip(alpha * 255.0 + 0.5, 0, 255)
+        return out
+    def to_image(self):
+        return Image.fromarray(self.to_array(), 'RGBA').copy()
+
+# Maximum per-channel difference between the numpy and PIL backends.
+NUMPY_BACKEND_TOLERANCE = 3
+
+COMPOSITE_BACKENDS = ('pil', 'numpy')
+
+def composite_frame_numpy(layout_items, loaders, frame_idx, total_frames, min_x, min_y, compositor, cache=None,
+                          plan=None, profiler=NULL_PROFILER, quality='final', held=None):
+    with profiler.timer('canvas', frame=frame_idx):
+        compositor.reset()
+    if plan is None:
+        plan = sorted(zip(layout_items, loaders), key=lambda x: x[0]['order'])
+    for item, loader in plan:
+        src = held.get(item, loader, frame_idx) if held is not None else None
+        if src is not None:
+            profiler.record('held', 0.0, item, frame_idx)
+        elif cache is not None:
+            key = ('premultiplied', loader.frame_key(frame_idx), item['width'], item['height'],
+                   item.get('rotation_degrees', 0), quality)
+            src = cache.get(key)
+            if src is not None:
+                profiler.record('cache_hit', 0.0, item, frame_idx)
+        if src is None:
+            img = transform_layer(item, loader, frame_idx, total_frames, profiler=profiler, quality=quality)
+            with profiler.timer('premultiply', item, frame_idx) as t:
+                src = premultiply(img)
+                t.nbytes = src.nbytes
+            if cache is not None:
+                cache.put(key, src)
+        if held is not None:
+            held.put(item, loader, frame_idx, src)
+        with profiler.timer('blend', item, frame_idx):
+            compositor.blend(src, *_paste_position(item, min_x, min_y))
+    return compositor
+
+class LayoutRenderer:
+    """Loaders, canvas geometry and transform cache for rendering one layout by frame index."""
+    def __init__(self, layout, frames=None, cache_bytes=256 * 1024 * 1024, lazy_gif=None, backend='pil',
+                 flatten=True, profiler=None, assets=None, tile_rows=None, quality='final', fps=None):
+        if backend not in COMPOSITE_BACKENDS:
+            raise ValueError(f"Unknown compositing backend {backend!r}")
+        if quality not in QUALITY_TIERS:
+            raise ValueError(f"Unknown quality tier {quality!r}")
+        self.quality = quality
+        if tile_rows and backend != 'pil':
+            raise ValueError("Tiled rendering uses the pil backend")
+        self.tile_rows = tile_rows
+        self.layout = layout
+        self.profiler = profiler or NULL_PROFILER
+        self.loaders = []
+        for item in layout:
+            with self.profiler.timer('open', item):
+                loader = get_loader(item, lazy_gif=lazy_gif, assets=assets)
+                self.loaders.append(timed_loader(loader, fps) if fps else loader)
+        if frames:
+            self.total_frames = frames
+        else:
+            self.total_frames = max((ldr.loop_frames if isinstance(ldr, TimedLoader) else ldr.num_frames()
+                                     for ldr in self.loaders), default=1)
+        min_x, min_y, max_x, max_y = compute_content_bounding_box(layout)
+        self.min_x, self.min_y = int(min_x), int(min_y)
+        self.canvas_size = (int(max_x) - self.min_x, int(max_y) - self.min_y)
+        self.cache = TransformCache(cache_bytes) if cache_bytes else None
+        self.held = HeldFrames()
+        self.backend = backend
+        self.compositor = NumpyCompositor(self.canvas_size) if backend == 'numpy' else None
+        if flatten and not tile_rows:
+            with self.profiler.timer('plate'):
+                self.plan = plan_layers(layout, self.loaders, self.min_x, self.min_y, self.canvas_size, quality)
+        else:
+            self.plan = sorted(zip(layout, self.loaders), key=lambda x: x[0]['order'])
+        self.render_seconds = 0.0
+    def period(self):
+        """Number of frames after which the composite repeats: the LCM of layer lengths."""
+        period = 1
+        for item, loader in self.plan:
+            period = math.lcm(period, max(1, loader.num_frames()))
+        return period
+    def iter_strips(self, idx):
+        """Yield (top, strip) for frame ``idx``; requires ``tile_rows``."""
+        strips = iter_frame_strips(self.layout, self.loaders, idx, self.total_frames, self.min_x, self.min_y,
+                                   self.canvas_size, self.tile_rows, self.cache, self.plan, self.profiler,
+                                   self.quality)
+        while True:
+            start = time.perf_counter()
+            strip = next(strips, None)
+            self.render_seconds += time.perf_counter() - start
+            if strip is None:
+                return
+            yield strip
+    def render(self, idx):
+        if self.tile_rows:
+            frame = Image.new('RGBA', self.canvas_size)
+            for top, strip in self.iter_strips(idx):
+                frame.paste(strip, (0, top))
+            return frame
+        start = time.perf_counter()
+        if self.compositor is not None:
+            composite_frame_numpy(self.layout, self.loaders, idx, self.total_frames,
+                                  self.min_x, self.min_y, self.compositor, self.cache, self.plan, self.profiler,
+                                  self.quality, self.held)
+            with self.profiler.timer('to_image', frame=idx) as t:
+                frame = self.compositor.to_image()
+                t.nbytes = TransformCache._cost(frame)
+        else:
+            frame = composite_frame(self.layout, self.loaders, idx, self.total_frames,
+                                    self.min_x, self.min_y, self.canvas_size, self.cache, self.plan, self.profiler,
+                                    self.quality, self.held)
+        self.render_seconds += time.perf_counter() - start
+        return frame
+    def render_array(self, idx):
+        """Render frame ``idx`` as an RGBA array; the numpy backend reuses one buffer."""
+        if self.compositor is None or self.tile_rows:
+            return np.asarray(self.render(idx))
+        start = time.perf_counter()
+        composite_frame_numpy(self.layout, self.loaders, idx, self.total_frames,
+                              self.min_x, self.min_y, self.compositor, self.cache, self.plan, self.profiler,
+                              self.quality, self.held)
+        with self.profiler.timer('to_array', frame=idx):
+            frame = self.compositor.to_array()
+        self.render_seconds += time.perf_counter() - start
+        return frame
+    def iter_images(self, stop, start=0):
+        for idx in range(start, stop):
+            yield idx, self.render(idx)
+    def stats(self):
+        return self.cache.stats() if self.cache is not None else None
+    def close(self):
+        for loader in self.loaders:
+            loader.close()
+
+# Per-process renderer for parallel export, built once by _init_worker, and
+# the pool's stop event, set when the export ends early.
+_worker_renderer = None
+_worker_stop = None
+
+def _init_worker(path, frames, options, stop):
+    global _worker_renderer, _worker_stop
+    _worker_stop = stop
+    options = dict(options)
+    if options.pop('profile', False):
+        options['profiler'] = ExportProfiler()
+    _worker_renderer = LayoutRenderer(parse_layout(path), frames, **options)
+
+def _worker_stats():
+    cache = _worker_renderer.cache
+    profiler = _worker_renderer.profiler
+    # Profiles are sent as deltas so each result stays small.
+    profile = profiler.drain() if profiler.enabled else None
+    return os.getpid(), cache.stats() if cache is not None else None, profile, _worker_renderer.period()
+
+def _save_range(folder_path, total_frames, compress_level, raw, start, stop):
+    writer = PngSequenceWriter(folder_path, total_frames, compress_level, raw)
+    profiler = _worker_renderer.profiler
+    outpaths = []
+    for idx in range(start, stop):
+        if _worker_stop.is_set():
+            break
+        if _worker_renderer.tile_rows:
+            outpaths.append(writer.write_strips(idx, _worker_renderer.canvas_size, _worker_renderer.iter_strips(idx)))
+            continue
+        frame = _worker_renderer.render(idx)
+        with profiler.timer('encode', frame=idx):
+            outpaths.append(writer.write(idx, frame))
+    return outpaths, _worker_stats()
+
+def _render_indices(indices):
+    frames = []
+    for idx in indices:
+        if _worker_stop.is_set():
+            break
+        frame = _worker_renderer.render(idx)
+        frames.append((frame.mode, frame.size, frame.tobytes()))
+    return frames, _worker_stats()
+
+def _frame_ranges(total_frames, workers):
+    # Contiguous chunks keep GIF/video decoding sequential inside each worker;
+    # several chunks per worker balance uneven frame costs.
+    chunk = max(1, -(-total_frames // (workers * 4)))
+    return [(start, min(start + chunk, total_frames)) for start in range(0, total_frames, chunk)]
+
+# How often a pooled export polls its cancel callable while a task runs.
+POOL_POLL_SECONDS = 0.05
+
+class _PoolFrameSource:
+    """Renders frames in a process pool, yielding results in submission order."""
+    def __init__(self, path, total_frames, options, workers, profiler=NULL_PROFILER, poll=None):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        self.workers = workers
+        self.total_frames = total_frames
+        self.profiler = profiler
+        self.poll = poll
+        if profiler.enabled:
+            options = dict(options, profile=True)
+        # Workers are spawned rather than forked: encoder subprocesses and their
+        # pipe threads may already be running in this process.
+        context = multiprocessing.get_context('spawn')
+        self._stop = context.Event()
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                         initargs=(path, total_frames, options, self._stop))
+        self._stats = {}
+        self._periods = {}
+    def _collect(self, future):
+        if self.poll is not None:
+            from concurrent.futures import wait
+            while not wait([future], timeout=POOL_POLL_SECONDS).done:
+                self.poll()
+        result, (pid, stats, profile, period) = future.result()
+        self._periods[pid] = period
+        if stats is not None:
+            self._stats[pid] = stats
+        if profile is not None:
+            self.profiler.merge(profile)
+        return result
+    def map(self, fn, args_list):
+        from collections import deque
+        pending = deque()
+        args_iter = iter(args_list)
+        for args in args_iter:
+            pending.append(self._pool.submit(fn, *args))
+            if len(pending) >= self.workers * 2:
+                break
+        while pending:
+            result = self._collect(pending.popleft())
+            for args in args_iter:
+                pending.append(self._pool.submit(fn, *args))
+                break
+            yield result
+    def render(self, indices):
+        frames = []
+        for chunk in self.map(_render_indices, [([idx],) for idx in indices]):
+            frames.extend(Image.frombytes(mode, size, data) for mode, size, data in chunk)
+        return frames
+    def iter_images(self, stop, start=0):
+        ranges = _frame_ranges(stop - start, self.workers)
+        idx = start
+        for chunk in self.map(_render_indices, [(range(start + a, start + b),) for a, b in ranges]):
+            for mode, size, data in chunk:
+                yield idx, Image.frombytes(mode, size, data)
+                idx += 1
+    def period(self):
+        # Each worker finds short videos on its own; None until they all agree.
+        periods = set(self._periods.values())
+        return periods.pop() if len(periods) == 1 else None
+    def stats(self):
+        # Each worker reports its own cumulative counters; sum the latest ones.
+        if not self._stats:
+            return None
+        return {k: sum(s[k] for s in self._stats.values()) for k in next(iter(self._stats.values()))}
+    def close(self):
+        # Only an export that stops early leaves tasks behind; drop them and
+        # stop running ones before their next frame.
+        self._stop.set()
+        self._pool.shutdown(cancel_futures=True)
+
+def probe_layout(layout, frames=None, fps=None):
+    """Return (total frames, canvas size, loop period) without decoding any frames."""
+    # Only the geometry and layer lengths are needed; lazy GIFs read just their headers.
+    probe = LayoutRenderer(layout, frames, 0, lazy_gif=True, flatten=False, fps=fps)
+    try:
+        return probe.total_frames, probe.canvas_size, probe.period()
+    finally:
+        probe.close()
+
+def _settled_period(period, total_frames, layout_period, reported):
+    """Return the period to repeat from, or ``total_frames`` if a video proved shorter than probed."""
+    if period < total_frames and reported != layout_period:
+        return total_frames
+    return period
+
+def _palette_sample_indices(total_frames, count=8):
+    return sorted({int(i * total_frames / count) for i in range(min(count, total_frames))})
+
+# Budget for rendered frames kept for re-sending repeats to encoders without native repeat.
+FRAME_MEMO_MAX_BYTES = 256 * 1024 * 1024
+
+class ExportCancelled(Exception):
+    """Raised by export_sequence when its ``cancel`` callable returns true."""
+
+def export_sequence(path, frames, cache_bytes=256 * 1024 * 1024, lazy_gif=None, workers=1, backend='pil',
+                    output=None, fps=24, compress_level=6, raw=False, writer_threads=1, progress=None,
+                    flatten=True, dedupe=True, link='hardlink', profiler=None, assets=None, tile_rows=None,
+                    quality='final', cancel=None, on_frame=None, timed=False):
+    """Render the layout at ``path`` to a PNG sequence next to it, or to the animated file ``output``.
+
+    Returns a summary of the export. ``cancel()`` is polled between frames and raises ExportCancelled;
+    ``on_frame(idx, frame)`` sees in-process frames. See the command-line help for the other options.
+    """
+    wall_start = time.perf_counter()
+    profiler = profiler or NULL_PROFILER
     folder_path = os.path.dirname(path)
     layout = parse_layout(path)
-    loaders = [get_loader(item) for item in layout]
-    if frames:
-        total_frames = frames
+    options = dict(cache_bytes=cache_bytes, lazy_gif=lazy_gif, backend=backend, flatten=flatten, assets=assets,
+                   tile_rows=tile_rows, quality=quality, fps=fps if timed else None)
+    if tile_rows and output:
+        raise ValueError("Tiled rendering writes PNG or raw sequences, not animated files")
+    if output:
+        output_dir = os.path.dirname(output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+    def check_cancel():
+        if cancel is not None and cancel():
+            raise ExportCancelled(f"Export of {path} cancelled")
+    pooled = bool(workers and workers > 1)
+    if pooled:
+        total_frames, canvas_size, layout_period = probe_layout(layout, frames, options['fps'])
+        source = _PoolFrameSource(path, total_frames, options, workers, profiler,
+                                  check_cancel if cancel is not None else None)
     else:
-        total_frames = max((ldr.num_frames() for ldr in loaders), default=1)
-    min_x, min_y, max_x, max_y = compute_content_bounding_box(layout)
+        source = LayoutRenderer(layout, frames, profiler=profiler, **options)
+        total_frames, canvas_size, layout_period = source.total_frames, source.canvas_size, source.period()
+    period = min(layout_period, total_frames) if dedupe else total_frames
+    encode_seconds = None
+    try:
+        samples = None
+        if output and os.path.splitext(output)[1].lower() == '.gif':
+            indices = _palette_sample_indices(period)
+            if pooled:
+                samples = source.render(indices)
+            else:
+                samples = [source.render(idx) for idx in indices]
+        writer = open_writer(output, folder_path, canvas_size, total_frames, fps, samples, compress_level, raw,
+                             link, period)
+        samples = None
+        if pooled and not output:
+            # PNG sequences are encoded and saved inside the workers.
+            done = 0
+            while done < period:
+                ranges = _frame_ranges(period - done, workers)
+                for outpaths in source.map(_save_range, [(folder_path, total_frames, compress_level, raw,
+                                                          done + start, done + stop) for start, stop in ranges]):
+                    check_cancel()
+                    done += len(outpaths)
+                    if progress is not None:
+                        progress(done, total_frames)
+                period = _settled_period(period, total_frames, layout_period, source.period())
+            for idx in range(period, total_frames):
+                check_cancel()
+                with profiler.timer('repeat', frame=idx):
+                    writer.repeat(idx, idx % period)
+                if progress is not None:
+                    progress(idx + 1, total_frames)
+            writer.close()
+        elif tile_rows:
+            # Strips are encoded as they are rendered; no frame is ever held whole.
+            loop_start, render_start = time.perf_counter(), source.render_seconds
+            rendered = 0
+            while rendered < period:
+                for idx in range(rendered, period):
+                    check_cancel()
+                    writer.write_strips(idx, canvas_size, source.iter_strips(idx))
+                    if progress is not None:
+                        progress(idx + 1, total_frames)
+                rendered = period
+                period = _settled_period(period, total_frames, layout_period, source.period())
+            for idx in range(period, total_frames):
+                check_cancel()
+                writer.repeat(idx, idx % period)
+                if progress is not None:
+                    progress(idx + 1, total_frames)
+            writer.close()
+            encode_seconds = time.perf_counter() - loop_start - (source.render_seconds - render_start)
+        else:
+            writer = ThreadedWriter(writer, total_frames, writer_threads, progress=progress, profiler=profiler)
+            memo = None
+            if period < total_frames and not writer.supports_repeat:
+                memo = TransformCache(FRAME_MEMO_MAX_BYTES)
+            try:
+                rendered = 0
+                while rendered < period:
+                    for idx, frame in source.iter_images(period, rendered):
+                        check_cancel()
+                        writer.write(idx, frame)
+                        if on_frame is not None:
+                            on_frame(idx, frame)
+                        if memo is not None:
+                            memo.put(idx, frame)
+                    rendered = period
+                    period = _settled_period(period, total_frames, layout_period, source.period())
+                for idx in range(period, total_frames):
+                    check_cancel()
+                    src_idx = idx % period
+                    if writer.supports_repeat:
+                        writer.repeat(idx, src_idx)
+                        continue
+                    frame = memo.get(src_idx) if memo is not None else None
+                    if frame is None:
+                        frame = source.render([src_idx])[0] if pooled else source.render(src_idx)
+                    writer.write(idx, frame)
+            finally:
+                writer.close()
+            encode_seconds = writer.encode_seconds
+    except ExportCancelled:
+        if output and os.path.exists(output):
+            os.remove(output)
+        raise
+    finally:
+        source.close()
+    cache_stats = source.stats()
+    return {
+        'frames': total_frames,
+        'period': period,
+        'size': canvas_size,
+        'output': output or folder_path,
+        'render_seconds': None if pooled else source.render_seconds,
+        'encode_seconds': encode_seconds,
+        'wall_seconds': time.perf_counter() - wall_start,
+        'cache': cache_stats,
+        'profile': profiler.report(cache_stats) if profiler.enabled else None,
+        'assets': assets.stats() if assets is not None else None,
+    }
 
-    min_x = int(min_x)
-    min_y = int(min_y)
-    max_x = int(max_x)
-    max_y = int(max_y)
+def iter_frames(layout, frames=None, cache_bytes=256 * 1024 * 1024, lazy_gif=None, backend='numpy', flatten=True,
+                quality='final', fps=None, assets=None, profiler=None):
+    """Render a layout and yield (idx, frame) RGBA arrays without encoding anything.
 
+    With the numpy backend every frame is one reused buffer; copy it to keep it.
+    """
+    if isinstance(layout, (str, os.PathLike)):
+        layout = parse_layout(layout)
+    renderer = LayoutRenderer(layout, frames, cache_bytes, lazy_gif, backend, flatten, profiler, assets,
+                              quality=quality, fps=fps)
+    try:
+        for idx in range(renderer.total_frames):
+            yield idx, renderer.render_array(idx)
+    finally:
+        renderer.close()
 
-    canvas_size = (max_x - min_x, max_y - min_y)
-    os.makedirs(folder_path, exist_ok=True)
-    for idx in range(total_frames):
-        frame = composite_frame(layout, loaders, idx, total_frames, min_x, min_y, canvas_size)
-        outpath = os.path.join(folder_path, f"frame_{idx:03d}.png")
-        frame.save(outpath)
-        print(f"Saved {outpath}")
+def write_raw_stream(stream, layout, **options):
+    """Write every frame of ``layout`` to ``stream`` as headerless raw RGBA; returns (frames, size)."""
+    count, size = 0, None
+    for idx, frame in iter_frames(layout, **options):
+        stream.write(memoryview(frame).cast('B'))
+        count, size = idx + 1, (frame.shape[1], frame.shape[0])
+    stream.flush()
+    return count, size
+
+def print_progress(done, total):
+    print(f"\rWrote {done}/{total} frames", end='\n' if done == total else '', flush=True)
 
 if __name__ == '__main__':
     import argparse
-    parser = argparse.ArgumentParser(description="Render layout JSON as image sequence, cropped to content.")
+    parser = argparse.ArgumentParser(description="Render layout JSON as image sequence or animation, cropped to content.")
     parser.add_argument('layout_json', help="Path to exported layout JSON file.")
     parser.add_argument('--frames', type=int, default=None, help="Number of frames (default=max over all media)")
+    parser.add_argument('--cache-mb', type=int, default=256, help="Memory budget for transformed layer cache in MB (0 disables)")
+    parser.add_argument('--gif-decode', choices=['auto', 'eager', 'lazy'], default='auto',
+                        help="Decode GIF frames up front (eager) or on demand (lazy); auto picks by decoded size")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes rendering frames in parallel (PNG sequences save in the workers)")
+    parser.add_argument('--backend', choices=COMPOSITE_BACKENDS, default='pil',
+                        help="Compositing backend; numpy blends into a reused premultiplied buffer")
+    parser.add_argument('-o', '--output', default=None,
+                        help="Encode directly to an animated file (%s) instead of a PNG sequence, with no "
+                        "intermediate files; .mp4 is flattened onto white" % ', '.join(sorted(ANIMATED_FORMATS)))
+    parser.add_argument('--fps', type=float, default=24,
+                        help="Output frame rate of animated files, and of layer timing with --timed")
+    parser.add_argument('--timed', action='store_true',
+                        help="Play each layer at its own GIF frame durations or video fps instead of one "
+                        "source frame per output frame; --frames then defaults to one loop of the longest layer")
+    parser.add_argument('--compress-level', type=int, default=6, choices=range(10), metavar='0-9',
+                        help="PNG/APNG zlib compression level; lower is faster and larger")
+    parser.add_argument('--raw', action='store_true', help="Write uncompressed RGBA frames (frame_NNN.rgba) instead of PNGs")
+    parser.add_argument('--writer-threads', type=int, default=1,
+                        help="Background threads encoding and writing frames (0 writes inline)")
+    parser.add_argument('--no-flatten', action='store_true',
+                        help="Blend every layer on every frame instead of pre-compositing still layers into plates")
+    parser.add_argument('--no-dedupe', action='store_true',
+                        help="Render every frame instead of one loop period of the layout (the LCM of its layer "
+                        "lengths) followed by repeats")
+    parser.add_argument('--link', choices=LINK_MODES, default='hardlink',
+                        help="How repeated frames of a PNG sequence are written (animated files re-send them)")
+    parser.add_argument('--profile', metavar='OUT_JSON', default=None,
+                        help="Write per-stage, per-layer and per-frame timings to this JSON file")
+    parser.add_argument('--tile-rows', type=int, default=None,
+                        help="Render and stream each frame in strips of this many rows to bound memory "
+                        "(PNG and raw sequences only; still layers are not flattened)")
+    parser.add_argument('--quality', choices=QUALITY_TIERS, default='final',
+                        help="Layer resampling: draft is faster, final is full quality")
+    parser.add_argument('--raw-stdout', action='store_true',
+                        help="Stream raw RGBA frames to stdout (e.g. into ffmpeg -f rawvideo -pix_fmt rgba) "
+                        "instead of writing files; --backend numpy avoids a copy per frame")
+    parser.add_argument('--asset-cache', metavar='DIR', default=None,
+                        help="Directory of decoded media reused across exports (default: per-user cache dir)")
+    parser.add_argument('--asset-cache-mb', type=int, default=2048, help="Size cap of the decoded-asset cache in MB")
+    parser.add_argument('--no-asset-cache', action='store_true', help="Decode all media from scratch")
     args = parser.parse_args()
+    if args.raw_stdout and (args.output or args.raw or args.tile_rows or args.workers > 1 or args.profile):
+        parser.error("--raw-stdout renders in-process to stdout; drop -o, --raw, --tile-rows, --workers and --profile")
 
-    export_sequence(args.layout_json, args.frames)
+    assets = None
+    if not args.no_asset_cache:
+        from asset_cache import AssetCache, default_cache_dir
+        assets = AssetCache(args.asset_cache or default_cache_dir(), args.asset_cache_mb * 1024 * 1024)
+    lazy_gif = {'auto': None, 'eager': False, 'lazy': True}[args.gif_decode]
+    if args.raw_stdout:
+        import sys
+        fps = args.fps if args.timed else None
+        total_frames, (width, height), _ = probe_layout(parse_layout(args.layout_json), args.frames, fps)
+        print(f"Streaming {total_frames} frames of {width}x{height} RGBA to stdout", file=sys.stderr)
+        try:
+            write_raw_stream(sys.stdout.buffer, args.layout_json, frames=args.frames,
+                             cache_bytes=args.cache_mb * 1024 * 1024, lazy_gif=lazy_gif, backend=args.backend,
+                             flatten=not args.no_flatten, quality=args.quality, fps=fps, assets=assets)
+        except BrokenPipeError:
+            # The reader went away; keep the interpreter from failing again on the closed stdout at exit.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        sys.exit(0)
+    summary = export_sequence(args.layout_json, args.frames, cache_bytes=args.cache_mb * 1024 * 1024,
+                              lazy_gif=lazy_gif, workers=args.workers, backend=args.backend, output=args.output,
+                              fps=args.fps, compress_level=args.compress_level, raw=args.raw,
+                              writer_threads=args.writer_threads, progress=print_progress,
+                              flatten=not args.no_flatten, dedupe=not args.no_dedupe, link=args.link,
+                              profiler=ExportProfiler() if args.profile else None, assets=assets,
+                              tile_rows=args.tile_rows, quality=args.quality, timed=args.timed)
+    width, height = summary['size']
+    print(f"Saved {summary['frames']} frames ({width}x{height}, {summary['period']} distinct) "
+          f"to {summary['output']} in {summary['wall_seconds']:.2f}s")
+    stats = summary['cache']
+    if stats is not None:
+        print(f"Transform cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['bytes'] / (1024 * 1024):.1f} MB in {stats['entries']} entries")
+    if args.profile:
+        with open(args.profile, 'w') as f:
+            json.dump(summary['profile'], f, indent=2)
+        stages = sorted(summary['profile']['stages'].items(), key=lambda kv: kv[1]['seconds'], reverse=True)
+        print("Profile: " + ', '.join(f"{name} {b['seconds']:.2f}s" for name, b in stages[:5])
+              + f" (written to {args.profile})")
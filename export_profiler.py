@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from collections import defaultdict
+
+class _Timer:
+    __slots__ = ('profiler', 'stage', 'item', 'frame', 'nbytes', '_start')
+    def __init__(self, profiler, stage, item, frame):
+        self.profiler = profiler
+        self.stage = stage
+        self.item = item
+        self.frame = frame
+        self.nbytes = 0
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+    def __exit__(self, *exc):
+        self.profiler.record(self.stage, time.perf_counter() - self._start, self.item, self.frame, self.nbytes)
+        return False
+
+class _NullTimer:
+    __slots__ = ('nbytes',)
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+
+class NullProfiler:
+    """Profiler stand-in used when profiling is off; every call is a no-op."""
+    enabled = False
+    _timer = _NullTimer()
+    def timer(self, stage, item=None, frame=None):
+        return self._timer
+    def record(self, stage, seconds, item=None, frame=None, nbytes=0):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+def _bucket():
+    return {'seconds': 0.0, 'calls': 0, 'bytes': 0}
+
+def _add(bucket, seconds, calls, nbytes):
+    bucket['seconds'] += seconds
+    bucket['calls'] += calls
+    bucket['bytes'] += nbytes
+
+class ExportProfiler:
+    """Records wall time, call counts and image bytes per export stage, layer and frame.
+
+    Stages: open, decode, resize, rotate, affine, premultiply, plate, canvas, blend, to_image,
+    to_array, encode and repeat, plus the zero-time counts cache_hit and held.
+    """
+    enabled = True
+    def __init__(self, on_stage=None):
+        self.on_stage = on_stage
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages = defaultdict(_bucket)
+        self._layers = {}
+        self._frames = defaultdict(lambda: defaultdict(_bucket))
+    def timer(self, stage, item=None, frame=None):
+        return _Timer(self, stage, item, frame)
+    def record(self, stage, seconds, item=None, frame=None, nbytes=0):
+        with self._lock:
+            _add(self._stages[stage], seconds, 1, nbytes)
+            if item is not None:
+                layer = self._layers.get(id(item))
+                if layer is None:
+                    layer = self._layers[id(item)] = {
+                        'path': item.get('path'), 'type': item.get('type'), 'order': item.get('order'),
+                        'stages': defaultdict(_bucket)}
+                _add(layer['stages'][stage], seconds, 1, nbytes)
+            if frame is not None:
+                _add(self._frames[frame][stage], seconds, 1, nbytes)
+        if self.on_stage is not None:
+            self.on_stage(stage, item, frame, seconds, nbytes)
+    def report(self, cache_stats=None):
+        """Return the collected costs as a JSON-serialisable dict."""
+        with self._lock:
+            layers = []
+            for layer in self._layers.values():
+                stages = {name: dict(b) for name, b in layer['stages'].items()}
+                layers.append({'path': layer['path'], 'type': layer['type'], 'order': layer['order'],
+                               'seconds': sum(b['seconds'] for b in stages.values()),
+                               'bytes': sum(b['bytes'] for b in stages.values()),
+                               'stages': stages})
+            layers.sort(key=lambda layer: layer['seconds'], reverse=True)
+            frames = [{'frame': idx,
+                       'seconds': sum(b['seconds'] for b in stages.values()),
+                       'stages': {name: dict(b) for name, b in stages.items()}}
+                      for idx, stages in sorted(self._frames.items())]
+            return {
+                'wall_seconds': time.perf_counter() - self.started,
+                'stages': {name: dict(b) for name, b in self._stages.items()},
+                'layers': layers,
+                'frames': frames,
+                'cache': cache_stats,
+            }
+    def drain(self):
+        """Return report() and reset the counters, for sending deltas between processes."""
+        report = self.report()
+        with self._lock:
+            self._stages.clear()
+            self._layers.clear()
+            self._frames.clear()
+        return report
+    def merge(self, report):
+        """Fold a report() from another process into this profiler."""
+        with self._lock:
+            for name, b in report['stages'].items():
+                _add(self._stages[name], b['seconds'], b['calls'], b['bytes'])
+            for layer in report['layers']:
+                key = ('merged', layer['order'], layer['path'])
+                mine = self._layers.get(key)
+                if mine is None:
+                    mine = self._layers[key] = {'path': layer['path'], 'type': layer['type'],
+                                                'order': layer['order'], 'stages': defaultdict(_bucket)}
+                for name, b in layer['stages'].items():
+                    _add(mine['stages'][name], b['seconds'], b['calls'], b['bytes'])
+            for frame in report['frames']:
+                for name, b in frame['stages'].items():
+                    _add(self._frames[frame['frame']][name], b['seconds'], b['calls'], b['bytes'])
+    def write(self, path, cache_stats=None):
+        with open(path, 'w') as f:
+            json.dump(self.report(cache_stats), f, indent=2)
@@ -0,0 +1,290 @@
+import json
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from PIL import Image, GifImagePlugin
+import imageio_ffmpeg
+
+# Output extensions that are encoded as a single animated file.
+ANIMATED_FORMATS = {'.gif', '.png', '.apng', '.webp', '.mp4'}
+# How PngSequenceWriter emits repeated frames; each falls back to the next.
+LINK_MODES = ('hardlink', 'symlink', 'copy')
+
+def sequence_frame_name(idx, total_frames, ext='.png'):
+    # Keep the historical frame_000.png names, widening only past 1000 frames.
+    width = max(3, len(str(max(total_frames - 1, 0))))
+    return f"frame_{idx:0{width}d}{ext}"
+
+def _write_png_chunk(fp, tag, data):
+    fp.write(struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data)))
+
+class PngSequenceWriter:
+    """Writes one PNG (or raw RGBA) file per frame; repeated frames become links or copies."""
+    ordered = False
+    supports_repeat = True
+    def __init__(self, folder_path, total_frames, compress_level=6, raw=False, size=None, link='hardlink'):
+        if link not in LINK_MODES:
+            raise ValueError(f"Unknown link mode {link!r}")
+        self.folder_path = folder_path
+        self.total_frames = total_frames
+        self.compress_level = compress_level
+        self.raw = raw
+        self.link = link
+        os.makedirs(folder_path, exist_ok=True)
+        if raw and size is not None:
+            with open(os.path.join(folder_path, 'raw_frames.json'), 'w') as f:
+                json.dump({'width': size[0], 'height': size[1], 'mode': 'RGBA', 'frames': total_frames}, f)
+    def path_for(self, idx):
+        ext = '.rgba' if self.raw else '.png'
+        return os.path.join(self.folder_path, sequence_frame_name(idx, self.total_frames, ext))
+    def write(self, idx, frame):
+        outpath = self.path_for(idx)
+        if os.path.islink(outpath) or (os.path.exists(outpath) and os.stat(outpath).st_nlink > 1):
+            # A link left by an earlier deduplicated export; writing through it
+            # would overwrite the frame it points at.
+            os.remove(outpath)
+        if self.raw:
+            with open(outpath, 'wb') as f:
+                f.write(frame.convert('RGBA').tobytes())
+        else:
+            frame.save(outpath, compress_level=self.compress_level)
+        return outpath
+    def write_strips(self, idx, size, strips):
+        """Write a frame arriving as (top, RGBA strip) pairs, deflating one strip at a time."""
+        outpath = self.path_for(idx)
+        if os.path.islink(outpath) or (os.path.exists(outpath) and os.stat(outpath).st_nlink > 1):
+            os.remove(outpath)
+        with open(outpath, 'wb') as f:
+            if self.raw:
+                for top, strip in strips:
+                    f.write(strip.convert('RGBA').tobytes())
+                return outpath
+            width, height = size
+            f.write(b'\x89PNG\r\n\x1a\n')
+            _write_png_chunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            compressor = zlib.compressobj(self.compress_level)
+            prev = np.zeros((1, width * 4), np.uint8)
+            for top, strip in strips:
+                rows = np.asarray(strip.convert('RGBA')).reshape(strip.height, width * 4)
+                filtered = np.empty((strip.height, width * 4 + 1), np.uint8)
+                filtered[:, 0] = 2
+                # Up filter: each byte minus the byte above it, wrapping mod 256.
+                np.subtract(rows[0], prev[0], out=filtered[0, 1:])
+                np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+                prev = rows[-1:].copy()
+                data = compressor.compress(filtered.tobytes())
+                if data:
+                    _write_png_chunk(f, b'IDAT', data)
+            _write_png_chunk(f, b'IDAT', compressor.flush())
+            _write_png_chunk(f, b'IEND', b'')
+        return outpath
+    def repeat(self, idx, src_idx):
+        src, outpath = self.path_for(src_idx), self.path_for(idx)
+        if os.path.lexists(outpath):
+            os.remove(outpath)
+        if self.link == 'hardlink':
+            try:
+                os.link(src, outpath)
+                return outpath
+            except OSError:
+                pass
+        if self.link in ('hardlink', 'symlink'):
+            try:
+                os.symlink(os.path.basename(src), outpath)
+                return outpath
+            except OSError:
+                pass
+        shutil.copyfile(src, outpath)
+        return outpath
+    def close(self):
+        pass
+
+def build_gif_palette(samples, colors=255, max_pixels=256 * 1024):
+    """Quantise the opaque pixels of a few sample frames into one palette, leaving index 255 for transparency."""
+    pixels = []
+    for frame in samples:
+        arr = np.asarray(frame.convert('RGBA'))
+        pixels.append(arr[arr[..., 3] >= 128][:, :3])
+    pixels = np.concatenate(pixels) if pixels else np.zeros((0, 3), np.uint8)
+    if len(pixels) == 0:
+        pixels = np.zeros((1, 3), np.uint8)
+    if len(pixels) > max_pixels:
+        pixels = pixels[np.linspace(0, len(pixels) - 1, max_pixels).astype(np.int64)]
+    strip = Image.fromarray(np.ascontiguousarray(pixels.reshape(1, -1, 3)), 'RGB')
+    palette = strip.quantize(colors)
+    entries = palette.getpalette()[:colors * 3]
+    entries += [0] * (768 - len(entries))
+    palette.putpalette(entries)
+    return palette
+
+class GifWriter:
+    """Streams frames into an animated GIF with one global palette."""
+    TRANSPARENT = 255
+    ordered = True
+    supports_repeat = True
+    def __init__(self, path, size, fps, palette_samples, loop=0, keep_frames=0):
+        self.size = size
+        self.frame_ms = 1000.0 / fps
+        self.palette = build_gif_palette(palette_samples)
+        self.keep_frames = keep_frames
+        self._encoded = {}
+        self._count = 0
+        self._fp = open(path, 'wb')
+        w, h = size
+        palette_bytes = bytes(self.palette.getpalette()[:768])
+        self._fp.write(b'GIF89a' + struct.pack('<HH', w, h) + bytes([0xF7, self.TRANSPARENT, 0]))
+        self._fp.write(palette_bytes)
+        self._fp.write(b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', loop) + b'\x00')
+    def _write_encoded(self, data):
+        # Delays are in centiseconds; derive them from cumulative timestamps
+        # so rounding does not drift over long exports.
+        start = round(self._count * self.frame_ms / 10)
+        end = round((self._count + 1) * self.frame_ms / 10)
+        self._count += 1
+        # Graphic control extension: restore-to-background disposal, transparency on.
+        self._fp.write(b'!\xf9\x04\x09' + struct.pack('<H', end - start) + bytes([self.TRANSPARENT, 0]))
+        self._fp.write(data)
+    def write(self, idx, frame):
+        frame = frame.convert('RGBA')
+        indexed = frame.convert('RGB').quantize(palette=self.palette, dither=Image.Dither.NONE)
+        alpha = np.asarray(frame.getchannel('A'))
+        if (alpha < 128).any():
+            arr = np.array(indexed)
+            arr[alpha < 128] = self.TRANSPARENT
+            indexed = Image.fromarray(arr, 'P')
+        data = b''.join(GifImagePlugin.getdata(indexed))
+        if idx < self.keep_frames:
+            self._encoded[idx] = data
+        self._write_encoded(data)
+        return None
+    def repeat(self, idx, src_idx):
+        self._write_encoded(self._encoded[src_idx])
+        return None
+    def close(self):
+        if self._fp is not None:
+            self._fp.write(b';')
+            self._fp.close()
+            self._fp = None
+        self._encoded.clear()
+
+class FFmpegWriter:
+    """Pipes raw frames into an ffmpeg encoder (APNG, animated WebP, MP4)."""
+    ordered = True
+    supports_repeat = False
+    def __init__(self, path, size, fps, codec, pixelformat, output_params=(), flatten=False, quality=None):
+        self.flatten = flatten
+        w, h = size
+        if flatten:
+            # yuv420p needs even dimensions; pad instead of letting ffmpeg rescale.
+            w, h = w + w % 2, h + h % 2
+        self.size = (w, h)
+        self._gen = imageio_ffmpeg.write_frames(
+            path, self.size, pix_fmt_in='rgb24' if flatten else 'rgba', pix_fmt_out=pixelformat,
+            fps=fps, codec=codec, quality=quality, macro_block_size=1, output_params=list(output_params))
+        self._gen.send(None)
+    def write(self, idx, frame):
+        if self.flatten:
+            background = Image.new('RGBA', self.size, (255, 255, 255, 255))
+            background.alpha_composite(frame.convert('RGBA'))
+            frame = background.convert('RGB')
+        else:
+            frame = frame.convert('RGBA')
+        self._gen.send(frame.tobytes())
+        return None
+    def close(self):
+        if self._gen is not None:
+            self._gen.close()
+            self._gen = None
+
+def open_writer(output, folder_path, size, total_frames, fps=24, palette_samples=None, compress_level=6, raw=False,
+                link='hardlink', repeat_period=None):
+    """Return a writer for ``output``, or a PNG sequence writer when it is None."""
+    if not output:
+        return PngSequenceWriter(folder_path, total_frames, compress_level, raw, size, link)
+    ext = os.path.splitext(output)[1].lower()
+    if ext == '.gif':
+        keep = repeat_period if repeat_period and repeat_period < total_frames else 0
+        return GifWriter(output, size, fps, palette_samples or [], keep_frames=keep)
+    if ext in ('.png', '.apng'):
+        return FFmpegWriter(output, size, fps, 'apng', 'rgba',
+                            ['-f', 'apng', '-plays', '0', '-compression_level', str(compress_level)])
+    if ext == '.webp':
+        return FFmpegWriter(output, size, fps, 'libwebp_anim', 'yuva420p', ['-loop', '0'])
+    if ext == '.mp4':
+        return FFmpegWriter(output, size, fps, 'libx264', 'yuv420p', flatten=True, quality=5)
+    raise ValueError(f"Unsupported output format {ext!r}")
+
+class ThreadedWriter:
+    """Runs a writer's encode-and-write step on background threads behind a bounded queue."""
+    def __init__(self, writer, total_frames, threads=1, queue_size=8, progress=None, profiler=None):
+        self.writer = writer
+        self.profiler = profiler
+        self.total_frames = total_frames
+        self.progress = progress
+        self.done = 0
+        self.encode_seconds = 0.0
+        self._error = None
+        self._repeating = False
+        self._lock = threading.Lock()
+        if threads and writer.ordered:
+            threads = 1
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(threads or 0)]
+        for thread in self._threads:
+            thread.start()
+    @property
+    def supports_repeat(self):
+        return self.writer.supports_repeat
+    def _write(self, method, idx, arg):
+        start = time.perf_counter()
+        getattr(self.writer, method)(idx, arg)
+        elapsed = time.perf_counter() - start
+        if self.profiler is not None:
+            self.profiler.record('encode' if method == 'write' else 'repeat', elapsed, frame=idx)
+        with self._lock:
+            self.encode_seconds += elapsed
+            self.done += 1
+            if self.progress is not None:
+                self.progress(self.done, self.total_frames)
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    self._write(*item)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+    def _submit(self, method, idx, arg):
+        if self._error is not None:
+            raise self._error
+        if self._threads:
+            self._queue.put((method, idx, arg))
+        else:
+            self._write(method, idx, arg)
+    def write(self, idx, frame):
+        self._submit('write', idx, frame)
+    def repeat(self, idx, src_idx):
+        if not self._repeating and not self.writer.ordered:
+            # Repeats refer back to earlier frames; with several threads those
+            # may still be in flight, so let the queue drain once.
+            self._queue.join()
+            self._repeating = True
+        self._submit('repeat', idx, src_idx)
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.writer.close()
+        if self._error is not None:
+            raise self._error
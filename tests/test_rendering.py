@@ -0,0 +1,266 @@
+import json
+import os
+import subprocess
+from fractions import Fraction
+import imageio.v2 as imageio_v2
+import imageio_ffmpeg
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+from asset_cache import AssetCache
+from export_json_layout import (NUMPY_BACKEND_TOLERANCE, GifLoader, LayoutRenderer, StaticImageLoader, TimedLoader,
+                                VideoLoader, export_sequence, parse_layout, rotate_geometry, transform_layer)
+from frame_writers import GifWriter, PngSequenceWriter
+
+GIF_DURATIONS = [100, 100, 40, 40, 250, 60]
+
+def _png(path, size, seed):
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 256, (size[1], size[0], 4), np.uint8), 'RGBA').save(path)
+    return path
+
+def _gif(path, size, durations):
+    frames = []
+    for i in range(len(durations)):
+        frame = Image.new('RGBA', size, (0, 0, 0, 0))
+        x = i * size[0] // len(durations)
+        ImageDraw.Draw(frame).ellipse((x, 4, x + size[0] // 3, size[1] - 4), fill=(40 * i, 200, 90, 255))
+        frames.append(frame)
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=durations, loop=0, disposal=2)
+    return path
+
+@pytest.fixture
+def layout_path(tmp_path):
+    png = _png(str(tmp_path / 'still.png'), (90, 70), 0)
+    gif = _gif(str(tmp_path / 'anim.gif'), (60, 40), GIF_DURATIONS)
+    items = [
+        {'path': png, 'type': 'image', 'x': 0, 'y': 0, 'width': 160, 'height': 120, 'rotation_degrees': 0, 'order': 0},
+        {'path': gif, 'type': 'gif', 'x': 30, 'y': 20, 'width': 90, 'height': 60, 'rotation_degrees': 17, 'order': 1},
+        {'path': png, 'type': 'image', 'x': 100, 'y': 70, 'width': 45, 'height': 35, 'rotation_degrees': -90,
+         'order': 2},
+    ]
+    os.makedirs(tmp_path / 'out')
+    path = str(tmp_path / 'out' / 'layout.json')
+    with open(path, 'w') as f:
+        json.dump(items, f)
+    return path
+
+def _frames(folder):
+    names = sorted(name for name in os.listdir(folder) if name.startswith('frame_'))
+    return [np.asarray(Image.open(os.path.join(folder, name)).convert('RGBA')) for name in names]
+
+@pytest.mark.parametrize('compress_level', [0, 6])
+def test_write_strips_decodes_to_the_strips(tmp_path, compress_level):
+    img = Image.open(_png(str(tmp_path / 'src.png'), (37, 23), 1))
+    writer = PngSequenceWriter(str(tmp_path), 1, compress_level)
+    strips = [(top, img.crop((0, top, 37, min(top + 5, 23)))) for top in range(0, 23, 5)]
+    path = writer.write_strips(0, img.size, iter(strips))
+    assert np.array_equal(np.asarray(Image.open(path)), np.asarray(img))
+
+@pytest.mark.parametrize('tile_rows', [1, 7, 64, 1000])
+def test_tiled_render_matches_render(layout_path, tile_rows):
+    layout = parse_layout(layout_path)
+    plain = LayoutRenderer(layout, 6, flatten=False)
+    tiled = LayoutRenderer(layout, 6, tile_rows=tile_rows)
+    writer = PngSequenceWriter(os.path.dirname(layout_path), 6)
+    for idx in range(6):
+        path = writer.write_strips(idx, tiled.canvas_size, tiled.iter_strips(idx))
+        expected = np.asarray(plain.render(idx))
+        assert np.array_equal(np.asarray(Image.open(path).convert('RGBA')), expected)
+        assert np.array_equal(np.asarray(tiled.render(idx)), expected)
+    plain.close()
+    tiled.close()
+
+class _Durations:
+    def __init__(self, durations):
+        self._durations = durations
+    def num_frames(self):
+        return len(self._durations)
+    def durations(self):
+        return self._durations
+    def frame_key(self, idx):
+        return ('fake', idx)
+
+def _shown_at(durations, fps, idx):
+    # The frame on screen idx / fps seconds in, walking the loop with the same exact times.
+    durations = [Fraction(d).limit_denominator(1000) for d in durations]
+    t = Fraction(idx * 1000) / Fraction(fps).limit_denominator(1001) % sum(durations)
+    for k, d in enumerate(durations):
+        if t < d:
+            return k
+        t -= d
+
+@pytest.mark.parametrize('fps', [7, 24, 30, 29.97, 60])
+@pytest.mark.parametrize('durations', [GIF_DURATIONS, [1000 / 12] * 24, [20, 20, 500]])
+def test_timed_loader_matches_time_lookup(durations, fps):
+    timeline = TimedLoader(_Durations(durations), fps)
+    for idx in range(2 * timeline.period + 3):
+        assert timeline.source_index(idx) == _shown_at(durations, fps, idx)
+    assert timeline.source_index(timeline.period) == timeline.source_index(0)
+
+def test_timed_loader_reads_gif_durations(layout_path):
+    gif = parse_layout(layout_path)[1]['path']
+    for lazy in (False, True):
+        loader = GifLoader(gif, lazy=lazy)
+        assert loader.durations() == GIF_DURATIONS
+        timeline = TimedLoader(loader, 25)
+        assert [timeline.source_index(i) for i in range(timeline.period)] == [
+            _shown_at(GIF_DURATIONS, 25, i) for i in range(timeline.period)]
+        loader.close()
+
+def test_asset_cache_cold_and_warm_match(layout_path, tmp_path):
+    folder = os.path.dirname(layout_path)
+    export_sequence(layout_path, 8, workers=1)
+    expected = _frames(folder)
+    cache_dir = str(tmp_path / 'assets')
+    for run in ('cold', 'warm'):
+        assets = AssetCache(cache_dir)
+        export_sequence(layout_path, 8, workers=1, assets=assets)
+        assert all(np.array_equal(a, b) for a, b in zip(_frames(folder), expected))
+        stats = assets.stats()
+        assert stats['entries'] == 2
+        assert (stats['hits'], stats['misses']) == ((0, 2) if run == 'cold' else (2, 0))
+
+def _pattern(u, v):
+    return 127.5 + 100 * np.sin(2 * np.pi * (1.5 * u + 0.7 * v)) * np.cos(2 * np.pi * 1.2 * v)
+
+def _pattern_error(img, w, h, angle):
+    # Mean error against the exact pattern over pixels well inside the rotated layer.
+    size, (a, b, c, d, e, f) = rotate_geometry(w, h, angle)
+    X, Y = np.meshgrid(np.arange(size[0]) + 0.5, np.arange(size[1]) + 0.5)
+    x, y = a * X + b * Y + c, d * X + e * Y + f
+    inside = (x > 3) & (x < w - 3) & (y > 3) & (y < h - 3)
+    return np.abs(np.asarray(img, float)[..., 0] - _pattern(x / w, y / h))[inside].mean()
+
+@pytest.mark.parametrize('source, size, angle', [
+    ((80, 60), (160, 120), 10), ((80, 60), (240, 180), 33), ((90, 60), (100, 120), 45), ((320, 240), (100, 75), 20)])
+def test_final_affine_path_matches_or_beats_resize_then_rotate(tmp_path, source, size, angle):
+    sw, sh = source
+    u, v = (np.arange(sw) + 0.5) / sw, (np.arange(sh) + 0.5) / sh
+    gray = np.clip(np.round(_pattern(u[None, :], v[:, None])), 0, 255).astype(np.uint8)
+    path = str(tmp_path / 'pattern.png')
+    Image.fromarray(np.dstack([gray, gray, gray, np.full_like(gray, 255)]), 'RGBA').save(path)
+    loader = StaticImageLoader(path)
+    w, h = size
+    item = {'width': w, 'height': h, 'rotation_degrees': angle}
+    old = loader.img.resize(size, Image.LANCZOS).rotate(-angle, expand=True, resample=Image.BICUBIC)
+    new = transform_layer(item, loader, 0, 1, quality='final')
+    assert new.size == old.size
+    assert _pattern_error(new, w, h, angle) <= _pattern_error(old, w, h, angle) + 0.05
+
+@pytest.fixture(scope='module')
+def short_video(tmp_path_factory):
+    # 12 video frames in a container that a longer audio track stretches to 1.5 s, so the metadata claims 18.
+    path = str(tmp_path_factory.mktemp('video') / 'short.mp4')
+    subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), '-v', 'error', '-f', 'lavfi', '-i',
+                    'testsrc=size=64x48:rate=12:duration=1', '-f', 'lavfi', '-i', 'anullsrc=r=8000:cl=mono',
+                    '-t', '1.5', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-c:a', 'aac', path], check=True)
+    with imageio_v2.get_reader(path, 'ffmpeg') as reader:
+        frames = [np.asarray(Image.fromarray(frame).convert('RGBA')) for frame in reader]
+    assert len(frames) == 12
+    return path, frames
+
+def _video_loader(path):
+    loader = VideoLoader(path)
+    assert loader.num_frames() == 18
+    return loader
+
+def test_video_loader_sequential_reads_past_the_end(short_video):
+    path, frames = short_video
+    loader = _video_loader(path)
+    for idx in range(30):
+        assert np.array_equal(np.asarray(loader.get_frame(idx, 30)), frames[idx % 12])
+    assert loader.num_frames() == 12
+    loader.close()
+
+def test_video_loader_jump_past_the_end(short_video):
+    path, frames = short_video
+    loader = _video_loader(path)
+    assert np.array_equal(np.asarray(loader.get_frame(15, 30)), frames[3])
+    assert loader.num_frames() == 12
+    assert np.array_equal(np.asarray(loader.get_frame(4, 30)), frames[4])
+    loader.close()
+
+def test_video_loader_wraps_at_the_real_length(short_video):
+    path, frames = short_video
+    loader = _video_loader(path)
+    assert loader.frame_key(19) == (path, None, 19 % 12)
+    assert np.array_equal(np.asarray(loader.get_frame(19, 30)), frames[19 % 12])
+    assert np.array_equal(np.asarray(loader.get_frame(0, 30)), frames[0])
+    loader.close()
+
+def _file_bytes(folder):
+    names = sorted(name for name in os.listdir(folder) if name.startswith('frame_'))
+    return [open(os.path.join(folder, name), 'rb').read() for name in names]
+
+def test_pooled_export_matches_serial_bytes(layout_path):
+    folder = os.path.dirname(layout_path)
+    export_sequence(layout_path, 12, workers=1, dedupe=False)
+    expected = _file_bytes(folder)
+    assert len(expected) == 12
+    export_sequence(layout_path, 12, workers=2, dedupe=False)
+    assert _file_bytes(folder) == expected
+
+def test_numpy_backend_within_tolerance(layout_path, tmp_path):
+    # The fixture layout plus a stack of eight translucent layers, the documented worst case.
+    layout = parse_layout(layout_path)
+    for k in range(8):
+        path = _png(str(tmp_path / f'layer{k}.png'), (40, 30), 10 + k)
+        layout.append({'path': path, 'type': 'image', 'x': 10 + 3 * k, 'y': 60 + 2 * k, 'width': 50, 'height': 40,
+                       'rotation_degrees': 5 * k, 'order': 3 + k})
+    pil = LayoutRenderer(layout, 6, backend='pil')
+    numpy = LayoutRenderer(layout, 6, backend='numpy')
+    for idx in range(6):
+        expected = np.asarray(pil.render(idx), np.int16)
+        diff = np.abs(np.asarray(numpy.render(idx), np.int16) - expected)
+        assert diff.max() <= NUMPY_BACKEND_TOLERANCE
+    pil.close()
+    numpy.close()
+
+def _frame_count(path):
+    if path.endswith('.mp4'):
+        with imageio_v2.get_reader(path, 'ffmpeg') as reader:
+            return reader.count_frames()
+    with Image.open(path) as img:
+        return img.n_frames
+
+@pytest.mark.parametrize('ext', ['.gif', '.apng', '.webp', '.mp4'])
+def test_animated_writers_produce_readable_files(layout_path, tmp_path, ext):
+    output = str(tmp_path / f'anim{ext}')
+    export_sequence(layout_path, 12, output=output, fps=12)
+    assert _frame_count(output) == 12
+    if ext == '.gif':
+        with open(output, 'rb') as f:
+            header = f.read(13)
+        # The logical screen descriptor carries the one global colour table.
+        assert header[10] & 0x80
+        with Image.open(output) as img:
+            assert img.info['transparency'] == GifWriter.TRANSPARENT
+            assert (np.asarray(img.convert('RGBA'))[..., 3] == 0).any()
+
+def _render_diff(layout, frames):
+    flat = LayoutRenderer(layout, frames, flatten=True)
+    plain = LayoutRenderer(layout, frames, flatten=False)
+    diff = max(np.abs(np.asarray(flat.render(idx), np.int16) - np.asarray(plain.render(idx), np.int16)).max()
+               for idx in range(frames))
+    steps = len(flat.plan)
+    flat.close()
+    plain.close()
+    return diff, steps
+
+def test_flattened_base_plate_matches_layers(layout_path):
+    layout = parse_layout(layout_path)
+    layout.insert(1, dict(layout[0], x=20, y=10, rotation_degrees=30, order=0.5))
+    # The two bottom stills become one base plate; the top still stays a layer.
+    assert _render_diff(layout, 6) == (0, 3)
+
+def test_flattened_mid_plate_within_rounding(layout_path, tmp_path):
+    layout = parse_layout(layout_path)
+    for k in range(4):
+        path = _png(str(tmp_path / f'still{k}.png'), (40, 30), 20 + k)
+        layout.append({'path': path, 'type': 'image', 'x': 10 + 20 * k, 'y': 10 + 10 * k, 'width': 70, 'height': 50,
+                       'rotation_degrees': 7 * k, 'order': 3 + k})
+    diff, steps = _render_diff(layout, 6)
+    assert steps == 3
+    # Blending the plate once instead of its five layers in turn skips at most one rounding per layer.
+    assert diff <= 5